@@ -15,8 +15,8 @@ class ControlsAgent:
         if not threats:
             return self._get_mitre_fallback_controls(['T1190'])
         
-        # Extract MITRE techniques from threats
-        mitre_techniques = list(set([t.get('mitre_technique', 'T1190') for t in threats[:8]]))
+        # Extract MITRE techniques from threats (deduplicated, in threat rank order)
+        mitre_techniques = list(dict.fromkeys(t.get('mitre_technique', 'T1190') for t in threats[:8]))
         threat_summary = '\n'.join([f"- {t.get('title', 'Unknown')} ({t.get('mitre_technique', 'T1190')})" for t in threats[:5]])
         
         prompt = f"""Generate MITRE ATT&CK mapped security controls for these threats:
@@ -42,10 +42,8 @@ Return JSON with MITRE-mapped controls:
 Return ONLY JSON."""
         
         try:
-            response = await asyncio.wait_for(
-                self.llm.generate(prompt, max_tokens=1500),
-                timeout=90
-            )
+            async with asyncio.timeout(90):
+                response = await self.llm.generate(prompt, max_tokens=1500)
             
             # Parse JSON response
             import re
@@ -11,14 +11,18 @@ class IntelligenceAgent:
         self.llm = llm_client
         self.api_keys = api_keys or {}
     
-    async def gather_and_rank_threats(self, product_info: Dict[str, Any]) -> Dict[str, Any]:
-        """Step 1: Gather threat intel and rank by relevance using LLM"""
+    async def gather_and_rank_threats(self, product_info: Dict[str, Any], api_threats: List[Dict] = None) -> Dict[str, Any]:
+        """Step 1: Gather threat intel and rank by relevance using LLM
+        
+        api_threats may be passed in when the API sources were already queried
+        (e.g. prefetched while product info was being gathered).
+        """
         
         product_name = product_info.get('name', '')
         print(f"   🎯 Gathering threat intelligence for: {product_name}")
         
         # Get raw threat data from APIs + LLM
-        raw_threats = await self._gather_raw_threats(product_name, product_info)
+        raw_threats = await self._gather_raw_threats(product_name, product_info, api_threats)
         
         if not raw_threats:
             return {'threats': [], 'risk_assessment': {'overall_risk_level': 'LOW', 'risk_score': 2.0}}
@@ -38,19 +42,27 @@ class IntelligenceAgent:
             'sources_used': len(self.api_keys) if self.api_keys else 1
         }
     
-    async def _gather_raw_threats(self, product_name: str, product_info: Dict[str, Any]) -> List[Dict]:
-        """Gather raw threat data from APIs and LLM"""
-        all_threats = []
+    async def fetch_api_threats(self, product_name: str) -> List[Dict]:
+        """Query the API threat intelligence sources for a product name"""
+        if not self.api_keys:
+            return []
         
+        try:
+            async with OptimizedThreatIntel(self.api_keys) as threat_intel:
+                intel_data = await threat_intel.gather_intelligence(product_name, [product_name])
+                api_threats = self._process_intel_data(intel_data)
+                print(f"   📡 API intelligence: {len(api_threats)} threats from {intel_data.get('active_sources', 0)} sources")
+                return api_threats
+        except Exception as e:
+            print(f"   ⚠️ API intelligence failed: {e}")
+            return []
+    
+    async def _gather_raw_threats(self, product_name: str, product_info: Dict[str, Any], api_threats: List[Dict] = None) -> List[Dict]:
+        """Gather raw threat data from APIs and LLM"""
         # Try API sources first
-        if self.api_keys:
-            try:
-                async with OptimizedThreatIntel(self.api_keys) as threat_intel:
-                    intel_data = await threat_intel.gather_intelligence(product_name, [product_name])
-                    all_threats = self._process_intel_data(intel_data)
-                    print(f"   📡 API intelligence: {len(all_threats)} threats from {intel_data.get('active_sources', 0)} sources")
-            except Exception as e:
-                print(f"   ⚠️ API intelligence failed: {e}")
+        if api_threats is None:
+            api_threats = await self.fetch_api_threats(product_name)
+        all_threats = list(api_threats)
         
         # LLM fallback with enhanced prompt
         if not all_threats:
@@ -1,6 +1,7 @@
 """Professional HTML formatter for threat modeling reports"""
 import re
 import html
+import threading
 from typing import Dict, Any, List
 import markdown
 from markdown.extensions import tables, toc, codehilite
@@ -16,6 +17,8 @@ class ProfessionalHTMLFormatter:
                 'codehilite': {'css_class': 'highlight'}
             }
         )
+        # The Markdown instance is stateful and may be shared between sessions
+        self._markdown_lock = threading.Lock()
     
     def convert_markdown_to_html(self, content: str) -> str:
         """Convert markdown content to professional HTML"""
@@ -23,7 +26,8 @@ class ProfessionalHTMLFormatter:
         content = self._preprocess_content(content)
         
         # Convert markdown to HTML
-        html_content = self.markdown_processor.convert(content)
+        with self._markdown_lock:
+            html_content = self.markdown_processor.reset().convert(content)
         
         # Post-process for professional formatting
         html_content = self._postprocess_html(html_content)
@@ -171,7 +175,6 @@ class ProfessionalHTMLFormatter:
     <title>Threat Modeling Assessment - {escaped_product_name}</title>
     <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap" rel="stylesheet">
     <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
-    <script src="https://cdn.jsdelivr.net/npm/mermaid/dist/mermaid.min.js"></script>
     <style>
         :root {{
             --primary-color: #2563eb;
@@ -495,7 +498,7 @@ class ProfessionalHTMLFormatter:
             }}
         }}
     </style>
-    <script src="https://cdn.jsdelivr.net/npm/mermaid@10/dist/mermaid.min.js"></script>
+    <script defer src="https://cdn.jsdelivr.net/npm/mermaid@10.9.1/dist/mermaid.min.js"></script>
     <script>
         document.addEventListener('DOMContentLoaded', function() {{
             mermaid.initialize({{ 
@@ -2,12 +2,21 @@ import json
 import os
 import asyncio
 import re
+import string
+from collections import Counter
 from typing import Dict, Any
 from datetime import datetime
 # from mcp_diagram_generator import MCPDiagramGenerator  # No longer needed for batch processing
 from .professional_html_formatter import ProfessionalHTMLFormatter
 from .prompt_templates import PromptTemplates
 
+# Product names in filenames keep [a-zA-Z0-9._-]; every other ASCII character
+# maps to '_' (non-ASCII is encoded to '?' first, so it maps to '_' as well)
+FILENAME_ALLOWED_CHARS = frozenset(string.ascii_letters + string.digits + "._-")
+FILENAME_SAFE_TABLE = str.maketrans({
+    chr(c): '_' for c in range(128) if chr(c) not in FILENAME_ALLOWED_CHARS
+})
+
 class ReportAgent:
     """Enhanced LLM-powered threat modeling report generation with integrated validation"""
     
@@ -48,6 +57,19 @@ class ReportAgent:
         if not threats:
             return self._create_css_fallback_diagram(product_name)
         
+        scenario_type, prompt = self._build_scenario_diagram_prompt(threats, product_name, scenario_title)
+        
+        try:
+            async with asyncio.timeout(20):
+                response = await self.llm.generate(prompt, max_tokens=300)
+        except Exception as e:
+            print(f"⚠️ Scenario diagram generation failed: {e}")
+            return self._create_css_fallback_diagram(product_name)
+        
+        return self._render_scenario_diagram(scenario_type, response, product_name)
+    
+    def _build_scenario_diagram_prompt(self, threats, product_name: str, scenario_title: str):
+        """Return (scenario_type, prompt) for a scenario diagram"""
         # Extract scenario type from title
         scenario_type = "Attack"
         if "RCE" in scenario_title or "Remote Code" in scenario_title:
@@ -83,25 +105,19 @@ Rules:
 - Base on actual threat data
 - Use --> for connections
 """
-        
-        try:
-            response = await asyncio.wait_for(
-                self.llm.generate(prompt, max_tokens=300),
-                timeout=20
-            )
-            
-            mermaid_content = self._extract_mermaid_syntax(response)
-            if mermaid_content:
-                return f"""
+        return scenario_type, prompt
+    
+    def _render_scenario_diagram(self, scenario_type: str, response: str, product_name: str) -> str:
+        """Wrap an LLM diagram response, falling back to the CSS diagram"""
+        mermaid_content = self._extract_mermaid_syntax(response)
+        if mermaid_content:
+            return f"""
 <div class="diagram-container">
     <h4>🎯 {scenario_type} Flow</h4>
     <div class="mermaid">
 {mermaid_content}
     </div>
 </div>"""
-            
-        except Exception as e:
-            print(f"⚠️ Scenario diagram generation failed: {e}")
         
         return self._create_css_fallback_diagram(product_name)
     
@@ -140,10 +156,8 @@ Rules:
 """
         
         try:
-            response = await asyncio.wait_for(
-                self.llm.generate(prompt, max_tokens=400),
-                timeout=30
-            )
+            async with asyncio.timeout(30):
+                response = await self.llm.generate(prompt, max_tokens=400)
             
             # Extract and validate Mermaid syntax
             mermaid_content = self._extract_mermaid_syntax(response)
@@ -214,18 +228,30 @@ Rules:
                 report_content = report_content[:insert_pos] + "\n" + attack_flow_diagram + report_content[insert_pos:]
             return report_content
         
-        # Generate diagrams for each scenario (process in reverse order to maintain positions)
-        for i, scenario_match in enumerate(reversed(scenarios)):
-            scenario_title = scenario_match.group(1)
-            scenario_content = scenario_match.group(2)
-            
-            # Extract relevant threats for this scenario
-            scenario_threats = self._extract_scenario_threats(scenario_content, threats)
-            
-            # Generate scenario-specific diagram
-            scenario_diagram = await self.generate_scenario_diagram(scenario_threats, product_name, scenario_title)
-            
-            # Insert diagram at the end of this scenario
+        # Build one diagram prompt per scenario and send them as a single batch
+        diagram_prompts = []
+        for scenario_match in scenarios:
+            scenario_threats = self._extract_scenario_threats(scenario_match.group(2), threats)
+            if scenario_threats:
+                diagram_prompts.append(
+                    self._build_scenario_diagram_prompt(scenario_threats, product_name, scenario_match.group(1))
+                )
+            else:
+                diagram_prompts.append(None)
+        
+        responses = iter(await self.llm.generate_batch(
+            [entry[1] for entry in diagram_prompts if entry],
+            max_tokens=300,
+            timeout=20
+        ))
+        diagrams = [
+            self._render_scenario_diagram(entry[0], next(responses), product_name) if entry
+            else self._create_css_fallback_diagram(product_name)
+            for entry in diagram_prompts
+        ]
+        
+        # Insert each diagram at the end of its scenario (in reverse order to maintain positions)
+        for scenario_match, scenario_diagram in reversed(list(zip(scenarios, diagrams))):
             insert_pos = scenario_match.end()
             report_content = report_content[:insert_pos] + "\n" + scenario_diagram + report_content[insert_pos:]
         
@@ -278,8 +304,11 @@ Rules:
             'validation_summary': f'Proceeding with {threat_count} threats'
         }
     
-    async def generate_comprehensive_report(self, all_data: Dict[str, Any]) -> str:
-        """Generate complete threat modeling report with integrated validation"""
+    async def generate_comprehensive_report(self, all_data: Dict[str, Any], on_chunk=None) -> str:
+        """Generate complete threat modeling report with integrated validation
+        
+        on_chunk is passed to the LLM client to follow the draft as it streams.
+        """
         
         # Integrated data quality validation
         validation_result = self.validate_data_quality(all_data)
@@ -291,10 +320,10 @@ Rules:
         report_prompt = PromptTemplates.get_comprehensive_report_prompt(all_data)
         
         try:
-            report_content = await asyncio.wait_for(
-                self.llm.generate(report_prompt, max_tokens=6000),
-                timeout=180
-            )
+            # The caller bounds the whole step at 180s; stop the LLM call early
+            # enough that diagrams (up to 20s) still fit, instead of losing the report
+            async with asyncio.timeout(150):
+                report_content = await self.llm.generate(report_prompt, max_tokens=6000, on_chunk=on_chunk)
             
             # Clean and normalize LLM response
             report_content = self._clean_llm_response(report_content)
@@ -310,15 +339,14 @@ Rules:
             product_name = all_data.get('product_name', 'Unknown Product')
             report_content = await self.parse_and_generate_diagrams(report_content, threats, product_name)
             
-            # Add Mermaid.js script for diagram rendering
-            if '<div class="mermaid">' in report_content:
-                report_content += '\n<script src="https://cdn.jsdelivr.net/npm/mermaid/dist/mermaid.min.js"></script>\n<script>mermaid.initialize({startOnLoad:true});</script>'
+            # Mermaid.js is loaded by the page that displays the report (viewer,
+            # HTML download, saved report), so the body carries no script tags
             
             print(f"   ✅ REPORT GENERATED: {len(report_content)} characters, confidence {validation_result.get('confidence_score', 0)}/10")
             
             return report_content
             
-        except asyncio.TimeoutError:
+        except TimeoutError:
             print(f"   ⏰ Report generation timed out")
             return self._generate_basic_report(all_data)
         except Exception as e:
@@ -343,8 +371,9 @@ Rules:
         threats = all_data.get('threats', [])
         
         threat_count = len(threats)
-        high_severity = len([t for t in threats if t.get('severity') == 'HIGH'])
-        critical_severity = len([t for t in threats if t.get('severity') == 'CRITICAL'])
+        severity_counts = Counter(t.get('severity') for t in threats)
+        high_severity = severity_counts['HIGH']
+        critical_severity = severity_counts['CRITICAL']
         
         # Generate threat list with proper CVE formatting
         threat_items = []
@@ -390,7 +419,7 @@ The following threats were identified:
     def save_html_report(self, report_content: str, product_name: str) -> str:
         """Save report as professional HTML webpage"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_product_name = product_name.replace(' ', '_').replace('/', '_').replace('\\', '_')
+        safe_product_name = product_name.encode('ascii', 'replace').decode('ascii').translate(FILENAME_SAFE_TABLE)
         filename = f"{safe_product_name}_ThreatModel_{timestamp}.html"
         filepath = os.path.join(self.reports_dir, filename)
         
@@ -7,11 +7,16 @@ Lightweight demo version for POC
 import streamlit as st
 import asyncio
 import os
-import sys
+import string
+import threading
+from collections import Counter, OrderedDict
 from datetime import datetime
-import base64
 import time
-import streamlit.components.v1
+import hashlib
+import hmac
+import html
+import logging
+import re
 from typing import Dict, Any
 from simple_session import SimpleSessionManager
 
@@ -25,12 +30,11 @@ except ImportError:
             return 10
 
 # Import required modules with error handling
+# Agent modules (aiohttp, markdown, formatters) are imported lazily on the
+# paths that use them so plain page reruns don't pay for them
 try:
-    from llm_client import LLMClient, get_available_providers
-    from agents.product_info_agent import ProductInfoAgent
-    from agents.intelligence_agent import IntelligenceAgent
-    from agents.controls_agent import ControlsAgent
-    from agents.report_agent import ReportAgent
+    from llm_client import LLMClient
+    from llm_client import get_available_providers as _get_available_providers
 except Exception as e:
     import streamlit as st
     st.error(f"Error importing modules: {e}")
@@ -46,120 +50,614 @@ st.set_page_config(
 )
 
 # Custom CSS styles
-st.markdown("""
-<style>
-    /* Sidebar styling */
-    section[data-testid="stSidebar"] {
-        width: 280px !important;
-        min-width: 280px !important;
-    }
+@st.cache_resource
+def load_css() -> str:
+    """Read the app stylesheet once per server process"""
+    css_path = os.path.join(os.path.dirname(__file__), "static", "app.css")
+    with open(css_path, 'r', encoding='utf-8') as f:
+        return f"<style>\n{f.read()}</style>"
+
+st.markdown(load_css(), unsafe_allow_html=True)
+
+DEFAULT_OLLAMA_MODEL = 'deepseek-v3.1:671b-cloud'
+
+SEVERITY_ICONS = {
+    'CRITICAL': '🔴',
+    'HIGH': '🟠',
+    'MEDIUM': '🟡',
+    'LOW': '🟢'
+}
+
+MAIN_HEADER_HTML = """
+<div class="main-header">
+    <h1>🛡️ Cybersecurity Threat Assessment</h1>
+    <p>AI-Powered Threat Modeling & Risk Analysis</p>
+</div>
+"""
+
+# About panel text, kept as constants so reruns only pass the strings through
+ABOUT_SUMMARY_MD = """
+**🎯 Latest Attack Intelligence:** Prioritizes most current attack patterns and threat actor campaigns from latest available sources
+
+**📊 17-Source Intelligence:** NVD CVE, GitHub Security, CISA Alerts, Google CSE (12 databases), Microsoft Security with authority weighting
+"""
+
+ABOUT_DETAILS_MD = """
+**🔍 Scenario-Specific Modeling:**
+- **Dynamic Scenario Types:** Remote Code Execution, Privilege Escalation, Data Exfiltration, Availability, Supply Chain attacks
+- **Threat-Matched Attack Flows:** Each scenario gets unique attack flow diagrams based on actual threat intelligence
+- **CVE-Based Analysis:** Reconnaissance → Initial Access → Execution → Persistence → Privilege Escalation → Defense Evasion → Impact
+
+**🏆 Enhanced Intelligence:**
+- **Multi-Agent Ranking:** CVE Agent (CVSS + recency), Exploit Agent (weaponization status), Authority Agent (source credibility), Relevance Agent (product matching)
+- **Ensemble Scoring:** Authority weight × Recency factor × CVSS normalized × Relevance score
+- **Priority Algorithm:** Official sources (3x weight) → Verified sources (2x) → Community (1x) with exploit availability boost
+- **Accuracy Enhancement:** ThreatAccuracyEnhancer filters by exploit availability, patch status, attack complexity, detection difficulty
+"""
+
+# Daily quota box colors (background, border, text): >5, >2 and <=2 remaining
+QUOTA_STYLES = (
+    ("#e8f5e8", "#4caf50", "#2e7d32"),
+    ("#fff3e0", "#ff9800", "#e65100"),
+    ("#ffe1e9", "#ffb1c7", "#9b2542")
+)
+
+QUOTA_TEMPLATES = tuple(
+    f"""
+<div style="
+    background-color: {bg_color};
+    border-radius: 4px;
+    border: 1px solid {border_color};
+    color: {text_color};
+    padding: 16px;
+    margin-top: 8px;
+">
+    <div><strong>{{n}}</strong> assessments remaining</div>
+</div>
+"""
+    for bg_color, border_color, text_color in QUOTA_STYLES
+)
+
+# Whitelist for product names; whitespace is already collapsed to single spaces
+PRODUCT_NAME_CHARS = frozenset(string.ascii_letters + string.digits + " -_.+()[]{}&@#$%^*!?,;:'\"")
+
+# Session keys dropped by "New Assessment"; the search box itself is set to ""
+ASSESSMENT_STATE_KEYS = (
+    'assessment_complete', 'assessment_running', 'report_content', '_report_view',
+    'all_data', 'product_name', 'suggestions', 'selected_product',
+    'last_search', 'last_request', 'form_product_name', 'suggestion_pill'
+)
+
+# Report sanitizing patterns, compiled once: tags outside the allowed set are
+# stripped from downloads, and diagrams are replaced by placeholders in the PDF
+HTML_UNSAFE_TAG_RE = re.compile(r'<(?!/?(?:h[1-6]|p|ul|ol|li|strong|em|div|span)\b)[^>]*>')
+PDF_UNSAFE_TAG_RE = re.compile(r'<(?!/?(?:h[1-6]|p|ul|ol|li|strong|em|div|span|table|tr|td|th|tbody|thead)\b)[^>]*>')
+MERMAID_BLOCK_RE = re.compile(r'<div class="mermaid">.*?</div>', re.DOTALL)
+DIAGRAM_BLOCK_RE = re.compile(r'<div class="diagram-container">.*?</div>', re.DOTALL)
+
+# Download filenames keep [a-zA-Z0-9._-]; every other ASCII character maps to '_'
+FILENAME_ALLOWED_CHARS = frozenset(string.ascii_letters + string.digits + "._-")
+DOWNLOAD_FILENAME_TABLE = str.maketrans({
+    chr(c): '_' for c in range(128) if chr(c) not in FILENAME_ALLOWED_CHARS
+})
+
+def safe_download_filename(filename: str) -> str:
+    """Replace every character outside [a-zA-Z0-9._-] with '_'"""
+    # Non-ASCII characters become '?' first, which the table then maps to '_'
+    return filename.encode('ascii', 'replace').decode('ascii').translate(DOWNLOAD_FILENAME_TABLE)
+
+def format_basic_finding(threat) -> str:
+    """One <li> of the basic fallback report; threat text comes from LLM/API output"""
+    title = html.escape(str(threat.get("title", "Unknown")))
+    severity = html.escape(str(threat.get("severity", "Unknown")))
+    cve_id = html.escape(str(threat.get("cve_id", "N/A")))
+    return f'<li><strong>{title}</strong> - {severity} severity (CVE: {cve_id})</li>'
+
+@st.cache_data(ttl=300)
+def get_available_providers():
+    """Provider status for the sidebar, refreshed every 5 minutes"""
+    return _get_available_providers()
+
+@st.cache_data(ttl=300)
+def get_provider_choices():
+    """Sidebar dropdown options, their labels and the option index of each key"""
+    provider_options = []
+    provider_labels = {}
+    for provider_key, provider_info in get_available_providers().items():
+        provider_options.append(provider_key)
+        status_icon = "✅" if "Available" in provider_info["status"] else "❌"
+        description = provider_info.get('description', '')
+        provider_labels[provider_key] = f"{status_icon} {provider_info['model']} - {description}"
+    provider_index = {key: i for i, key in enumerate(provider_options)}
+    return provider_options, provider_labels, provider_index
+
+def resolve_model_id(provider_key: str) -> str:
+    """Map a sidebar provider key to the Ollama model id it selects"""
+    provider_info = get_available_providers().get(provider_key)
+    if provider_info and provider_info['provider'] == 'Ollama':
+        return provider_info['model_id']
+    return DEFAULT_OLLAMA_MODEL
+
+# Minimum gap between automatic product suggestion searches
+SUGGESTION_DEBOUNCE_SECONDS = 0.4
+
+# Completed assessments are reused for an hour (never past midnight)
+ASSESSMENT_CACHE_TTL = 3600
+# At most this many are kept; the oldest are dropped first
+ASSESSMENT_CACHE_MAX_ENTRIES = 64
+
+@st.cache_resource
+def get_usage_tracker() -> DailyUsageTracker:
+    """Daily quota shared by every session; the usage file is read once per process"""
+    return DailyUsageTracker()
+
+@st.cache_resource
+def get_assessment_cache() -> OrderedDict:
+    """Completed assessments shared across sessions, oldest first: key -> (created_at, report_content, all_data)"""
+    return OrderedDict()
+
+@st.cache_data
+def load_methodology(path: str, mtime: float) -> str:
+    """Read the methodology page once; mtime is part of the key so edits are picked up"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+@st.cache_resource
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """Process-wide event loop running on a daemon thread"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="async-worker", daemon=True).start()
+    return loop
+
+def run_in_background(coro, timeout: float = None):
+    """Run a coroutine on the shared background loop and wait for its result
     
-    /* Layout adjustments */
-    .block-container {
-        padding-top: 3rem !important;
-        margin-top: 0rem !important;
-    }
-    .main > div {
-        padding-top: 0rem !important;
-    }
+    Only for coroutines that don't call Streamlit: the loop thread has no
+    script run context. The assessment itself uses the session loop.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_background_loop())
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        future.cancel()
+        raise
+
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def get_product_suggestions(model_id: str, normalized_input: str) -> tuple:
+    """AI product-name completions for an input, cached per model and normalized input
     
-    /* Main header styling */
-    .main-header {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 15px;
-        color: white;
-        text-align: center;
-        margin: 1rem 0 2rem 0;
-        box-shadow: 0 4px 15px rgba(102, 126, 234, 0.3);
-        border: 1px solid rgba(255, 255, 255, 0.1);
-    }
+    Raises LookupError when nothing beyond the input itself came back (also the
+    agent's fallback when the LLM fails), so empty results are never cached.
+    """
+    _, agents = get_agents(model_id)
+    raw_suggestions = run_in_background(agents['product'].smart_product_completion(normalized_input), timeout=60)
+    # Names only, deduplicated in order; every suggestion comes from AI completion
+    suggestions = tuple(dict.fromkeys(
+        s for s in raw_suggestions or []
+        if s and s.lower() != normalized_input
+    ))
+    if not suggestions:
+        raise LookupError(f"No product suggestions for '{normalized_input}'")
+    return suggestions
+
+@st.cache_resource
+def get_llm_client(model_id: str) -> LLMClient:
+    """Shared LLM client for a model; API keys are read from secrets/env by the client"""
+    return LLMClient('ollama', model=model_id)
+
+@st.cache_resource
+def get_agents(model_id: str):
+    """Shared LLM client and streamlined 4-agent pipeline for a model"""
+    from agents.product_info_agent import ProductInfoAgent
+    from agents.intelligence_agent import IntelligenceAgent
+    from agents.controls_agent import ControlsAgent
+    from agents.report_agent import ReportAgent
     
-    /* Red theme when threats found */
-    .main-header.threats-found {
-        background: linear-gradient(135deg, #dc2626 0%, #991b1b 100%) !important;
-        box-shadow: 0 4px 15px rgba(220, 38, 38, 0.3) !important;
-    }
+    llm = get_llm_client(model_id)
     
-    /* Login container styling */
-    .login-container {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 15px;
-        color: white;
-        text-align: center;
-        margin: 1rem 0 2rem 0;
-        box-shadow: 0 4px 15px rgba(102, 126, 234, 0.3);
-        border: 1px solid rgba(255, 255, 255, 0.1);
+    # API keys for 17-source threat intelligence
+    api_keys = {
+        'nvd_api_key': os.getenv('NVD_API_KEY'),
+        'github_token': os.getenv('GITHUB_TOKEN'),
+        'google_cse_key': os.getenv('GOOGLE_CSE_KEY'),
+        'google_cse_id': os.getenv('GOOGLE_CSE_ID')
     }
     
-    /* Progress bar styling */
-    .stProgress > div > div > div > div {
-        background: linear-gradient(90deg, #667eea, #764ba2);
+    agents = {
+        'product': ProductInfoAgent(llm),
+        'intelligence': IntelligenceAgent(llm, api_keys),
+        'controls': ControlsAgent(llm),
+        'report': ReportAgent(llm)
     }
+    return llm, agents
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_report_view(report_content: str):
+    """Compose the report viewer HTML and estimate its iframe height, once per report"""
+    mermaid_html = REPORT_VIEWER_TEMPLATE.replace('__REPORT__', report_content)
     
-    /* Threat card styling */
-    .threat-card {
-        background: var(--secondary-background-color, #262730);
-        color: var(--text-color, #fafafa);
-        padding: 1rem;
-        border-radius: 8px;
-        border-left: 4px solid #dc2626;
-        margin: 1rem 0;
-        border: 1px solid #dc2626;
-        box-shadow: 0 2px 8px rgba(220, 38, 38, 0.2);
-    }
+    # Calculate dynamic height
+    word_count = len(report_content.split())
+    diagram_count = report_content.count('mermaid')
+    estimated_height = max(word_count * 2 + diagram_count * 400 + 500, 1000)
     
-    [data-theme="light"] .threat-card {
-        background: #fef2f2;
-        color: #991b1b;
-        border: 1px solid #fca5a5;
-        border-left: 4px solid #dc2626;
-    }
+    return mermaid_html, estimated_height
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_report_pdf(content: str) -> bytes:
+    """Render the PDF version of a report once per report (WeasyPrint is slow)"""
+    import weasyprint
+    from io import BytesIO
     
-    /* Mobile responsive design */
-    @media (max-width: 768px) {
-        section[data-testid="stSidebar"] {
-            display: none !important;
+    # Clean content for PDF
+    if isinstance(content, str):
+        safe_content = PDF_UNSAFE_TAG_RE.sub('', content)
+    else:
+        safe_content = content
+    
+    # Remove Mermaid diagrams for PDF (they don't render well)
+    safe_content = MERMAID_BLOCK_RE.sub('<p><strong>[Attack Flow Diagram]</strong></p>', safe_content)
+    safe_content = DIAGRAM_BLOCK_RE.sub('<p><strong>[Attack Flow Analysis Chart]</strong></p>', safe_content)
+    
+    # Create PDF-optimized HTML
+    pdf_html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <style>
+            @page {{
+                size: A4;
+                margin: 2cm;
+            }}
+            body {{
+                font-family: Arial, sans-serif;
+                background-color: #ffffff;
+                color: #262730;
+                margin: 0;
+                padding: 0;
+                line-height: 1.6;
+                font-size: 12px;
+            }}
+            .report-container {{
+                width: 100%;
+                margin: 0;
+                background: #ffffff;
+                padding: 0;
+                box-sizing: border-box;
+            }}
+            h1 {{
+                color: #2c3e50;
+                border-bottom: 3px solid #667eea;
+                padding-bottom: 10px;
+                margin-bottom: 20px;
+                font-size: 24px;
+                page-break-after: avoid;
+            }}
+            h2 {{
+                color: #34495e;
+                margin-top: 30px;
+                border-left: 4px solid #667eea;
+                padding-left: 15px;
+                font-size: 18px;
+                page-break-after: avoid;
+            }}
+            h3 {{
+                color: #2c3e50;
+                margin-top: 25px;
+                font-size: 14px;
+                page-break-after: avoid;
+            }}
+            .critical {{
+                background-color: #fee;
+                color: #c53030;
+                padding: 2px 6px;
+                border-radius: 4px;
+                font-weight: bold;
+            }}
+            .mitre {{
+                background-color: #e6f3ff;
+                color: #1a365d;
+                padding: 2px 6px;
+                border-radius: 3px;
+                font-family: monospace;
+                font-weight: bold;
+            }}
+            ul, ol {{
+                margin: 10px 0;
+                padding-left: 20px;
+            }}
+            li {{
+                margin: 5px 0;
+            }}
+            p {{
+                margin: 10px 0;
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="report-container">
+            {safe_content}
+        </div>
+    </body>
+    </html>
+    """
+    
+    # Generate PDF directly to BytesIO
+    pdf_buffer = BytesIO()
+    weasyprint.HTML(string=pdf_html).write_pdf(pdf_buffer)
+    pdf_content = pdf_buffer.getvalue()
+    pdf_buffer.close()
+    
+    return pdf_content
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_report_html(content: str) -> bytes:
+    """Standalone interactive HTML report, encoded once per report"""
+    if isinstance(content, str):
+        safe_content = HTML_UNSAFE_TAG_RE.sub('', content)
+    else:
+        safe_content = content
+    
+    full_html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <style>
+            body {{
+                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+                background-color: #ffffff;
+                color: #262730;
+                margin: 0;
+                padding: 20px;
+                line-height: 1.6;
+            }}
+            .report-container {{
+                width: 100%;
+                margin: 0;
+                background: #ffffff;
+                padding: 15px;
+                box-sizing: border-box;
+            }}
+            h1 {{
+                color: #2c3e50;
+                border-bottom: 3px solid #667eea;
+                padding-bottom: 10px;
+                margin-bottom: 20px;
+            }}
+            h2 {{
+                color: #34495e;
+                margin-top: 30px;
+                border-left: 4px solid #667eea;
+                padding-left: 15px;
+            }}
+            h3 {{
+                color: #2c3e50;
+                margin-top: 25px;
+            }}
+            .critical {{
+                background-color: #fee;
+                color: #c53030;
+                padding: 2px 6px;
+                border-radius: 4px;
+                font-weight: bold;
+            }}
+            .mitre {{
+                background-color: #e6f3ff;
+                color: #1a365d;
+                padding: 2px 6px;
+                border-radius: 3px;
+                font-family: monospace;
+                font-weight: bold;
+            }}
+            .mermaid {{
+                text-align: center;
+                margin: 20px 0;
+                padding: 20px;
+                background-color: #f8f9fa;
+                border: 1px solid #dee2e6;
+                border-radius: 5px;
+            }}
+        </style>
+        <script src="https://cdn.jsdelivr.net/npm/mermaid@10.9.1/dist/mermaid.min.js"></script>
+    </head>
+    <body>
+        <div class="report-container">
+            {safe_content}
+        </div>
+        <script>
+            mermaid.initialize({{
+                startOnLoad: true,
+                theme: 'default',
+                securityLevel: 'strict',
+                flowchart: {{
+                    useMaxWidth: true,
+                    htmlLabels: false
+                }}
+            }});
+        </script>
+    </body>
+    </html>
+    """
+    
+    return full_html.encode("utf-8")
+
+# Report viewer shell; the report body is substituted for __REPORT__ at render time
+REPORT_VIEWER_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <meta http-equiv="Content-Security-Policy" content="default-src 'self'; script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; style-src 'self' 'unsafe-inline'; frame-ancestors 'self';">
+    <style>
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            background-color: #ffffff;
+            color: #262730;
+            margin: 0;
+            padding: 0;
+            line-height: 1.6;
+            width: 100%;
         }
-        .main .block-container {
-            padding: 0.5rem !important;
-            margin-left: 0 !important;
+        .report-container {
+            width: 100%;
+            margin: 0;
+            padding: 0;
+            background: #ffffff;
+            box-sizing: border-box;
+            position: absolute;
+            left: 0;
+            top: 0;
         }
-        .stButton > button {
-            width: 100% !important;
-            margin-bottom: 0.5rem !important;
-            font-size: 0.8rem !important;
-            padding: 0.4rem !important;
+        h1 {
+            color: #2c3e50;
+            border-bottom: 3px solid #667eea;
+            padding-bottom: 10px;
+            margin-bottom: 20px;
         }
-        .stTextInput {
-            width: 100% !important;
+        h2 {
+            color: #34495e;
+            margin-top: 30px;
+            border-left: 4px solid #667eea;
+            padding-left: 15px;
         }
-        .stForm {
-            padding: 0.5rem !important;
+        h3 {
+            color: #2c3e50;
+            margin-top: 25px;
         }
-        .main-header {
-            padding: 1rem !important;
-            margin-bottom: 1rem !important;
+        .critical {
+            background-color: #fee;
+            color: #c53030;
+            padding: 2px 6px;
+            border-radius: 4px;
+            font-weight: bold;
         }
-        .main-header h1 {
-            font-size: 1.3rem !important;
+        .mitre {
+            background-color: #e6f3ff;
+            color: #1a365d;
+            padding: 2px 6px;
+            border-radius: 3px;
+            font-family: monospace;
+            font-weight: bold;
         }
-        .main-header p {
-            font-size: 0.9rem !important;
+        .mermaid {
+            text-align: center;
+            margin: 20px 0;
+            padding: 20px;
+            background-color: #f8f9fa;
+            border: 1px solid #dee2e6;
+            border-radius: 5px;
         }
-    }
-    
-    @media (max-width: 480px) {
-        .main .block-container {
-            padding: 0.25rem !important;
+    </style>
+    <script defer src="https://cdn.jsdelivr.net/npm/mermaid@10.9.1/dist/mermaid.min.js"></script>
+</head>
+<body>
+    <div class="report-container">
+        __REPORT__
+    </div>
+
+    <script>
+        // Render every unprocessed diagram in one mermaid.run() pass; mermaid marks
+        // nodes with data-processed itself, and a failing diagram doesn't stop the rest
+        function renderMermaid() {
+            if (!document.querySelector('.mermaid:not([data-processed])')) {
+                return;
+            }
+            mermaid.run({
+                querySelector: '.mermaid:not([data-processed])',
+                suppressErrors: true
+            }).catch((error) => console.error('Mermaid render error:', error));
         }
-        h1 {
-            font-size: 1.2rem !important;
+
+        function adjustHeight() {
+            const body = document.body;
+            const html = document.documentElement;
+            const height = Math.max(
+                body.scrollHeight,
+                body.offsetHeight,
+                html.clientHeight,
+                html.scrollHeight,
+                html.offsetHeight
+            );
+
+            window.parent.postMessage({
+                type: 'streamlit:setFrameHeight',
+                height: height + 100
+            }, '*');
         }
-    }
-</style>
-""", unsafe_allow_html=True)
+
+        // mermaid is loaded with defer, so it is only available from DOMContentLoaded
+        document.addEventListener('DOMContentLoaded', function() {
+            mermaid.initialize({
+                startOnLoad: false,
+                theme: 'default',
+                securityLevel: 'strict',
+                flowchart: {
+                    useMaxWidth: true,
+                    htmlLabels: false
+                },
+                themeVariables: {
+                    background: '#ffffff',
+                    primaryColor: '#667eea',
+                    primaryTextColor: '#262730',
+                    fontFamily: 'Arial, sans-serif'
+                }
+            });
+
+            const container = document.querySelector('.report-container');
+            renderMermaid();
+            adjustHeight();
+
+            // Report height only changes when diagrams render or the frame resizes
+            new ResizeObserver(() => adjustHeight()).observe(container);
+            new MutationObserver(() => renderMermaid()).observe(container, {childList: true, subtree: true});
+        });
+    </script>
+</body>
+</html>
+"""
+
+class ThrottledProgress:
+    """Progress bar and status line that coalesce writes to one per interval
+    
+    Updates arriving inside the interval replace each other; the latest one is
+    written by the next update after the interval or by flush(), which the
+    assessment coroutine calls before long awaits and when it finishes. Writes
+    never run from event loop callbacks. 100% is written immediately.
+    """
+    
+    def __init__(self, progress_bar, status_text, interval: float = 0.25):
+        self.progress_bar = progress_bar
+        self.status_text = status_text
+        self.interval = interval
+        self._percent, self._message = 0, None
+        self._shown_percent, self._shown_message = 0, None
+        self._last_write = 0.0
+    
+    @property
+    def percent(self) -> int:
+        """Latest requested percentage (shown or pending)"""
+        return self._percent
+    
+    def update(self, percent: int, message: str = None):
+        self._percent = percent
+        if message is not None:
+            self._message = message
+        
+        if percent >= 100 or time.monotonic() - self._last_write >= self.interval:
+            self.flush()
+    
+    def flush(self):
+        if self._percent != self._shown_percent:
+            self.progress_bar.progress(self._percent)
+            self._shown_percent = self._percent
+        if self._message != self._shown_message:
+            self.status_text.markdown(self._message)
+            self._shown_message = self._message
+        self._last_write = time.monotonic()
 
 class ThreatModelingWebApp:
     """Streamlit web interface for threat modeling"""
@@ -175,12 +673,12 @@ class ThreatModelingWebApp:
             'report_content': None,
             'product_name': "",
             'all_data': None,
-            'suggestions': [],
+            'suggestions': (),
             'selected_product': "",
             'last_search': "",
             'valid_products': [],
             'assessment_running': False,
-            'usage_tracker': DailyUsageTracker(),
+            'last_request': 0,
             'show_methodology': False,
             'selected_llm_provider': 'ollama-deepseek-v3-1-671b-cloud',
             # Session management
@@ -191,62 +689,63 @@ class ThreatModelingWebApp:
             'last_activity': 0
         }
         
-        for key, value in defaults.items():
-            if key not in st.session_state:
-                st.session_state[key] = value
+        state = st.session_state
+        state.update({key: value for key, value in defaults.items() if key not in state})
+    
+    def run_async(self, coro):
+        """Run a coroutine on this session's persistent event loop
+        
+        Reusing the loop keeps its default thread pool (used for the blocking
+        LLM calls) warm across assessments instead of rebuilding it per run.
+        """
+        loop = st.session_state.get('_event_loop')
+        if loop is None or loop.is_closed():
+            loop = asyncio.new_event_loop()
+            st.session_state._event_loop = loop
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            # A rerun can interrupt the loop mid-run; don't let leftover tasks
+            # resume the next time the loop is used
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
     
     async def run_assessment(self, product_name: str):
         """Run the threat assessment with progress tracking"""
         
         # Get selected LLM provider and model
         provider_key = st.session_state.get('selected_llm_provider', 'gemini-2.0-flash')
-        providers = get_available_providers()
-        
-        if provider_key in providers:
-            provider_info = providers[provider_key]
-            if provider_info['provider'] == 'Ollama':
-                llm = LLMClient('ollama', model=provider_info['model_id'])
-            else:
-                llm = LLMClient('ollama', model='deepseek-v3.1:671b-cloud')
-        else:
-            llm = LLMClient('ollama', model='deepseek-v3.1:671b-cloud')
+        llm, agents = get_agents(resolve_model_id(provider_key))
         
         if not llm.is_available():
-            st.error(f"❌ {provider.title()} API key not found in secrets or environment variables")
+            st.error(f"❌ {llm.provider.title()} API key not found in secrets or environment variables")
             return None, None
         
-        # API keys for 17-source threat intelligence
-        api_keys = {
-            'nvd_api_key': os.getenv('NVD_API_KEY'),
-            'github_token': os.getenv('GITHUB_TOKEN'),
-            'google_cse_key': os.getenv('GOOGLE_CSE_KEY'),
-            'google_cse_id': os.getenv('GOOGLE_CSE_ID')
-        }
-        
-        # Streamlined 4-agent architecture
-        agents = {
-            'product': ProductInfoAgent(llm),
-            'intelligence': IntelligenceAgent(llm, api_keys),
-            'controls': ControlsAgent(llm),
-            'report': ReportAgent(llm)
-        }
-        
-        # Progress tracking
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        status_box = st.empty()
+        # Progress tracking, grouped in one collapsible status container
+        status = st.status("🛡️ Running threat assessment...", expanded=True)
+        with status:
+            progress = ThrottledProgress(st.progress(0), st.empty())
+            status_box = st.empty()
+        status_state = "error"
         
         all_data = {
             "product_name": product_name,
             "timestamp": datetime.now().isoformat()
         }
+        intel_prefetch = None
         
         try:
-            st.session_state.assessment_running = True
-            
             # Step 1: Product Information
-            status_text.markdown("**🔍 Step 1: Gathering product information...**")
-            progress_bar.progress(10)
+            progress.update(10, "**🔍 Step 1: Gathering product information...**")
+            
+            # Speculatively query the API threat sources with the entered name
+            # while the product is analyzed; reused in Step 3 if the name holds
+            intel_prefetch = asyncio.create_task(
+                agents['intelligence'].fetch_api_threats(product_name)
+            )
             
             with st.spinner("🔍 Analyzing product information..."):
                 try:
@@ -258,130 +757,156 @@ class ThreatModelingWebApp:
             status_box.success("Product information gathered successfully")
             all_data["product_info"] = product_info
             
-            # Step 2: Threat Intelligence
-            status_text.markdown("**🎯 Step 2: Fetching threat intelligence...**")
-            progress_bar.progress(25)
-            
-            # Show detailed status during threat intelligence gathering
-            status_container = st.container()
-            with status_container:
-                st.info("🔍 **Gathering from 17 threat intelligence sources:**")
-                source_status = st.empty()
-                
-                # Update status during processing
-                source_status.markdown("""
-                - 🏢 **NVD CVE Database** - Searching official vulnerabilities...
-                - 🐙 **GitHub Security Advisories** - Checking recent advisories...
-                - 🏛️ **CISA Alerts** - Scanning government alerts...
-                - 🔍 **Google CSE (12 sources)** - Comprehensive search across security databases...
-                - 🏢 **Microsoft Security** - Vendor-specific advisories...
-                """)
-            
-            # Skip separate threat intelligence step - now handled in comprehensive analysis
-            source_status.empty()
-            status_box.success("✅ **Ready for comprehensive analysis**")
+            # Step 2: Threat Intelligence (the source queries already started with the prefetch)
+            progress.update(25, "**🎯 Step 2: Fetching threat intelligence...**")
             
             # Step 3: LLM-Driven Threat Intelligence & Ranking
-            status_text.markdown("**🎯 Step 3: Gathering & ranking threats by relevance...**")
-            progress_bar.progress(40)
+            progress.update(40, "**🎯 Step 3: Gathering & ranking threats by relevance...**")
             
             # Show analysis status
-            intel_status = st.empty()
-            intel_status.info("🎯 **LLM Analysis:** Gathering threat intelligence and ranking by product relevance...")
+            status_box.info("🎯 **LLM Analysis:** Gathering threat intelligence and ranking by product relevance...")
+            progress.flush()
+            
+            resolved_name = product_info.get('name', '') if isinstance(product_info, dict) else ''
+            if str(resolved_name).strip().lower() == product_name.strip().lower():
+                api_threats = await intel_prefetch
+            else:
+                # Product was renamed during analysis - query the sources again
+                intel_prefetch.cancel()
+                api_threats = None
             
             try:
-                comprehensive_result = await agents['intelligence'].gather_and_rank_threats(product_info)
+                comprehensive_result = await agents['intelligence'].gather_and_rank_threats(
+                    product_info, api_threats=api_threats
+                )
             except Exception as e:
                 st.error(f"Threat intelligence failed: {e}")
                 return None, None
             
-            intel_status.empty()
             status_box.success("✅ **Threat Intelligence Complete:** Threats gathered and ranked by relevance")
             
             # Update all_data with results
             all_data["threats"] = comprehensive_result.get('threats', [])
             all_data["risk_assessment"] = comprehensive_result.get('risk_assessment', {})
             
-            progress_bar.progress(60)
+            progress.update(60)
             
-            # Step 4: MITRE-Mapped Security Controls
-            status_text.markdown("**🛡️ Step 4: Generating MITRE-mapped controls...**")
+            # Nothing to map controls to or report on - skip the remaining LLM calls
+            if not all_data["threats"]:
+                progress.update(100, "**✅ Assessment completed - no threats found**")
+                status_box.success("No relevant threats identified for this product")
+                status_state = "complete"
+                return self.generate_no_threats_report(product_name, product_info), all_data
             
-            with st.spinner("🛡️ Generating MITRE ATT&CK mapped security controls..."):
-                try:
-                    controls = await asyncio.wait_for(
-                        agents['controls'].generate_mitre_controls(
-                            comprehensive_result.get('threats', []),
-                            comprehensive_result.get('risk_assessment', {})
-                        ),
-                        timeout=120
-                    )
-                except asyncio.TimeoutError:
-                    st.warning("Control generation timed out - using basic controls")
-                    # Provide basic fallback controls
-                    controls = {
-                        "preventive": ["Multi-factor authentication", "Network segmentation", "Regular patching"],
-                        "detective": ["Security monitoring", "Log analysis", "Intrusion detection"],
-                        "corrective": ["Incident response plan", "Backup and recovery", "Security training"]
-                    }
-                except Exception as e:
-                    st.warning(f"MITRE control generation failed: {str(e)}")
-                    controls = {
-                        "preventive": [{"control": "Multi-factor Authentication", "mitre_mitigation": "M1032"}],
-                        "detective": [{"control": "Network Monitoring", "mitre_mitigation": "M1047"}],
-                        "corrective": [{"control": "Incident Response Plan", "mitre_mitigation": "M1049"}]
-                    }
-            
-            status_box.success("Security control framework established")
-            all_data["controls"] = controls
+            # Steps 4 & 5: controls and report only depend on the ranked threats,
+            # so run them concurrently and report progress as each one finishes
+            progress.update(60, "**🛡️ Steps 4-5: Generating MITRE-mapped controls and comprehensive report...**")
+            progress.flush()
             
-            progress_bar.progress(80)
+            # Count the report draft as the LLM streams it; the loop below shows it
+            drafted_chars = 0
             
-            # Step 5: Enhanced Report Generation
-            status_text.markdown("**📊 Step 5: Generating comprehensive report...**")
+            def on_report_chunk(text):
+                nonlocal drafted_chars
+                drafted_chars += len(text)
             
-            with st.spinner("📊 Generating comprehensive report with integrated validation..."):
-                try:
-                    # Enhanced report generation with integrated review and batch diagrams
-                    report_content = await asyncio.wait_for(
-                        agents['report'].generate_comprehensive_report(all_data),
-                        timeout=180
+            with st.spinner("🛡️ Generating MITRE ATT&CK mapped controls and report with integrated validation..."):
+                # TaskGroup cancels the sibling if this coroutine is cancelled or one task fails
+                async with asyncio.TaskGroup() as tg:
+                    controls_task = tg.create_task(
+                        self._generate_controls(agents['controls'], comprehensive_result)
+                    )
+                    report_task = tg.create_task(
+                        self._generate_report(agents['report'], all_data, on_chunk=on_report_chunk)
                     )
                     
-                    # Check for termination recommendation from professional report agent
-                    if report_content is None:
-                        progress_bar.progress(100)
-                        st.session_state.assessment_running = False
-                        status_text.markdown("**⚠️ Analysis terminated due to insufficient data quality**")
-                        st.warning("Analysis terminated: Data quality validation failed. No actionable threat intelligence found with sufficient confidence. Please try a different product name or check API connectivity.")
-                        return None, None
-                        
-                except asyncio.TimeoutError:
-                    st.warning("Report generation timed out - generating basic report")
-                    report_content = self.generate_basic_report(all_data)
-                except Exception as e:
-                    st.warning(f"Report generation failed: {str(e)} - generating basic report")
-                    report_content = self.generate_basic_report(all_data)
+                    pending = {controls_task, report_task}
+                    shown_chars = 0
+                    while pending:
+                        # Wake every interval to show the draft's progress from this coroutine
+                        done, pending = await asyncio.wait(
+                            pending, timeout=progress.interval, return_when=asyncio.FIRST_COMPLETED
+                        )
+                        if drafted_chars != shown_chars and not report_task.done():
+                            shown_chars = drafted_chars
+                            progress.update(progress.percent, f"**✍️ Step 5: Drafting report... {drafted_chars:,} characters written**")
+                        if controls_task in done:
+                            status_box.success("Security control framework established")
+                        if report_task in done:
+                            status_box.success("Enhanced report generation completed")
+                        if done:
+                            progress.update(100 if not pending else 80)
+                            progress.flush()
+                
+                controls = controls_task.result()
+                report_content = report_task.result()
             
-            status_box.success("Enhanced report generation completed")
+            all_data["controls"] = controls
             
-            progress_bar.progress(100)
-            st.session_state.assessment_running = False
-            status_text.markdown("**✅ Assessment completed successfully!**")
+            # Check for termination recommendation from professional report agent
+            if report_content is None:
+                progress.update(100, "**⚠️ Analysis terminated due to insufficient data quality**")
+                st.warning("Analysis terminated: Data quality validation failed. No actionable threat intelligence found with sufficient confidence. Please try a different product name or check API connectivity.")
+                return None, None
+            
+            progress.update(100, "**✅ Assessment completed successfully!**")
             status_box.success("Threat assessment report generated successfully")
+            status_state = "complete"
             
             return report_content, all_data
             
         except Exception as e:
-            st.session_state.assessment_running = False
             st.error(f"❌ Error during assessment: {str(e)}")
             # Log the full error for debugging
-            import traceback
-            print(f"Assessment error details: {traceback.format_exc()}")
+            logging.exception("Assessment error details")
             return None, None
         finally:
-            # Ensure assessment_running is always reset
-            st.session_state.assessment_running = False
+            # Write any pending progress now rather than from a later loop run
+            progress.flush()
+            if status_state == "complete":
+                status.update(label="✅ Threat assessment complete", state="complete", expanded=False)
+            else:
+                status.update(label="⚠️ Threat assessment did not complete", state="error")
+            # Don't leave the speculative API fetch running after an early exit
+            if intel_prefetch is not None and not intel_prefetch.done():
+                intel_prefetch.cancel()
+    
+    async def _generate_controls(self, controls_agent, comprehensive_result):
+        """Step 4: MITRE-mapped security controls with basic fallbacks"""
+        try:
+            async with asyncio.timeout(120):
+                return await controls_agent.generate_mitre_controls(
+                    comprehensive_result.get('threats', []),
+                    comprehensive_result.get('risk_assessment', {})
+                )
+        except TimeoutError:
+            st.warning("Control generation timed out - using basic controls")
+            # Provide basic fallback controls
+            return {
+                "preventive": ["Multi-factor authentication", "Network segmentation", "Regular patching"],
+                "detective": ["Security monitoring", "Log analysis", "Intrusion detection"],
+                "corrective": ["Incident response plan", "Backup and recovery", "Security training"]
+            }
+        except Exception as e:
+            st.warning(f"MITRE control generation failed: {str(e)}")
+            return {
+                "preventive": [{"control": "Multi-factor Authentication", "mitre_mitigation": "M1032"}],
+                "detective": [{"control": "Network Monitoring", "mitre_mitigation": "M1047"}],
+                "corrective": [{"control": "Incident Response Plan", "mitre_mitigation": "M1049"}]
+            }
+    
+    async def _generate_report(self, report_agent, all_data, on_chunk=None):
+        """Step 5: Enhanced report generation, falling back to the basic report"""
+        try:
+            # Enhanced report generation with integrated review and batch diagrams
+            async with asyncio.timeout(180):
+                return await report_agent.generate_comprehensive_report(all_data, on_chunk=on_chunk)
+        except TimeoutError:
+            st.warning("Report generation timed out - generating basic report")
+            return self.generate_basic_report(all_data)
+        except Exception as e:
+            st.warning(f"Report generation failed: {str(e)} - generating basic report")
+            return self.generate_basic_report(all_data)
     
     def display_threat_summary(self, all_data):
         """Display threat summary cards"""
@@ -395,138 +920,33 @@ class ThreatModelingWebApp:
             
         st.subheader("🎯 Threat Summary")
         
-        # Create columns for threat cards
-        cols = st.columns(min(len(threats), 3))
+        # Build all cards as one HTML block so the summary is a single element
+        cards = []
+        for threat in threats[:3]:
+            # Each field is read once; a missing severity gets the default icon
+            severity = threat.get('severity', 'Unknown')
+            severity_icon = SEVERITY_ICONS.get(severity, '⚪')
+            title = html.escape(str(threat.get('title', 'Unknown Threat')))
+            metrics = "".join(
+                f'<div class="threat-metric"><span>{label}</span><strong>{html.escape(str(value))}</strong></div>'
+                for label, value in (
+                    ("Severity", severity),
+                    ("CVSS Score", threat.get('cvss_score', 'N/A')),
+                    ("CVE ID", threat.get('cve_id', 'N/A'))
+                )
+            )
+            cards.append(
+                f'<div class="threat-card"><h3>{severity_icon} {title}</h3>'
+                f'<div class="threat-metrics">{metrics}</div></div>'
+            )
         
-        for i, threat in enumerate(threats[:3]):
-            with cols[i % 3]:
-                severity = threat.get('severity', 'UNKNOWN')
-                severity_color = {
-                    'CRITICAL': '🔴',
-                    'HIGH': '🟠', 
-                    'MEDIUM': '🟡',
-                    'LOW': '🟢'
-                }.get(severity, '⚪')
-                
-                with st.container():
-                    st.markdown(f"### {severity_color} {threat.get('title', 'Unknown Threat')}")
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("Severity", threat.get('severity', 'Unknown'))
-                    with col2:
-                        st.metric("CVSS Score", threat.get('cvss_score', 'N/A'))
-                    with col3:
-                        st.metric("CVE ID", threat.get('cve_id', 'N/A'))
-                    st.markdown("---")
+        st.markdown(f'<div class="threat-summary">{"".join(cards)}</div>', unsafe_allow_html=True)
     
     def create_pdf_download(self, content: str, filename: str):
         """Create PDF download using Streamlit's download_button"""
         try:
-            import weasyprint
-            import re
-            from io import BytesIO
-            
-            # Clean content for PDF
-            if isinstance(content, str):
-                safe_content = re.sub(r'<(?!/?(?:h[1-6]|p|ul|ol|li|strong|em|div|span|table|tr|td|th|tbody|thead)\b)[^>]*>', '', content)
-            else:
-                safe_content = content
-            
-            # Remove Mermaid diagrams for PDF (they don't render well)
-            safe_content = re.sub(r'<div class="mermaid">.*?</div>', '<p><strong>[Attack Flow Diagram]</strong></p>', safe_content, flags=re.DOTALL)
-            safe_content = re.sub(r'<div class="diagram-container">.*?</div>', '<p><strong>[Attack Flow Analysis Chart]</strong></p>', safe_content, flags=re.DOTALL)
-            
-            safe_filename = re.sub(r'[^a-zA-Z0-9._-]', '_', filename.replace('.html', '.pdf'))
-            
-            # Create PDF-optimized HTML
-            pdf_html = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <style>
-                    @page {{
-                        size: A4;
-                        margin: 2cm;
-                    }}
-                    body {{
-                        font-family: Arial, sans-serif;
-                        background-color: #ffffff;
-                        color: #262730;
-                        margin: 0;
-                        padding: 0;
-                        line-height: 1.6;
-                        font-size: 12px;
-                    }}
-                    .report-container {{
-                        width: 100%;
-                        margin: 0;
-                        background: #ffffff;
-                        padding: 0;
-                        box-sizing: border-box;
-                    }}
-                    h1 {{
-                        color: #2c3e50;
-                        border-bottom: 3px solid #667eea;
-                        padding-bottom: 10px;
-                        margin-bottom: 20px;
-                        font-size: 24px;
-                        page-break-after: avoid;
-                    }}
-                    h2 {{
-                        color: #34495e;
-                        margin-top: 30px;
-                        border-left: 4px solid #667eea;
-                        padding-left: 15px;
-                        font-size: 18px;
-                        page-break-after: avoid;
-                    }}
-                    h3 {{
-                        color: #2c3e50;
-                        margin-top: 25px;
-                        font-size: 14px;
-                        page-break-after: avoid;
-                    }}
-                    .critical {{
-                        background-color: #fee;
-                        color: #c53030;
-                        padding: 2px 6px;
-                        border-radius: 4px;
-                        font-weight: bold;
-                    }}
-                    .mitre {{
-                        background-color: #e6f3ff;
-                        color: #1a365d;
-                        padding: 2px 6px;
-                        border-radius: 3px;
-                        font-family: monospace;
-                        font-weight: bold;
-                    }}
-                    ul, ol {{
-                        margin: 10px 0;
-                        padding-left: 20px;
-                    }}
-                    li {{
-                        margin: 5px 0;
-                    }}
-                    p {{
-                        margin: 10px 0;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="report-container">
-                    {safe_content}
-                </div>
-            </body>
-            </html>
-            """
-            
-            # Generate PDF directly to BytesIO
-            pdf_buffer = BytesIO()
-            weasyprint.HTML(string=pdf_html).write_pdf(pdf_buffer)
-            pdf_content = pdf_buffer.getvalue()
-            pdf_buffer.close()
+            safe_filename = safe_download_filename(filename.replace('.html', '.pdf'))
+            pdf_content = build_report_pdf(content)
             
             # Use Streamlit's download_button instead of data URI
             if st.download_button(
@@ -541,115 +961,20 @@ class ThreatModelingWebApp:
             return ""  # Return empty string since button handles download
             
         except ImportError:
-            # Fallback to HTML if WeasyPrint not available
-            return self.create_html_download(content, filename)
+            # WeasyPrint not available - the HTML download button covers this case
+            return ""
         except Exception as e:
             print(f"PDF generation failed: {e}")
-            return self.create_html_download(content, filename)
+            return ""
     
     def create_html_download(self, content: str, filename: str):
-        """Create HTML download as fallback"""
-        import html
-        import re
+        """Build the interactive HTML report, returning (filename, html_bytes)"""
+        safe_filename = safe_download_filename(filename)
         
-        if isinstance(content, str):
-            safe_content = re.sub(r'<(?!/?(?:h[1-6]|p|ul|ol|li|strong|em|div|span)\b)[^>]*>', '', content)
-        else:
-            safe_content = content
-        safe_filename = re.sub(r'[^a-zA-Z0-9._-]', '_', filename)
-        
-        full_html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <style>
-                body {{
-                    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                    background-color: #ffffff;
-                    color: #262730;
-                    margin: 0;
-                    padding: 20px;
-                    line-height: 1.6;
-                }}
-                .report-container {{
-                    width: 100%;
-                    margin: 0;
-                    background: #ffffff;
-                    padding: 15px;
-                    box-sizing: border-box;
-                }}
-                h1 {{
-                    color: #2c3e50;
-                    border-bottom: 3px solid #667eea;
-                    padding-bottom: 10px;
-                    margin-bottom: 20px;
-                }}
-                h2 {{
-                    color: #34495e;
-                    margin-top: 30px;
-                    border-left: 4px solid #667eea;
-                    padding-left: 15px;
-                }}
-                h3 {{
-                    color: #2c3e50;
-                    margin-top: 25px;
-                }}
-                .critical {{
-                    background-color: #fee;
-                    color: #c53030;
-                    padding: 2px 6px;
-                    border-radius: 4px;
-                    font-weight: bold;
-                }}
-                .mitre {{
-                    background-color: #e6f3ff;
-                    color: #1a365d;
-                    padding: 2px 6px;
-                    border-radius: 3px;
-                    font-family: monospace;
-                    font-weight: bold;
-                }}
-                .mermaid {{
-                    text-align: center;
-                    margin: 20px 0;
-                    padding: 20px;
-                    background-color: #f8f9fa;
-                    border: 1px solid #dee2e6;
-                    border-radius: 5px;
-                }}
-            </style>
-            <script src="https://cdn.jsdelivr.net/npm/mermaid@10/dist/mermaid.min.js"></script>
-        </head>
-        <body>
-            <div class="report-container">
-                {safe_content}
-            </div>
-            <script>
-                mermaid.initialize({{
-                    startOnLoad: true,
-                    theme: 'default',
-                    securityLevel: 'strict',
-                    flowchart: {{
-                        useMaxWidth: true,
-                        htmlLabels: false
-                    }}
-                }});
-            </script>
-        </body>
-        </html>
-        """
-        
-        b64 = base64.b64encode(full_html.encode()).decode()
-        href = f'<a href="data:text/html;base64,{b64}" download="{safe_filename}">🌐 Download Interactive Report (HTML)</a>'
-        return href
+        return safe_filename, build_report_html(content)
     
     def check_rate_limit(self):
         """Simple rate limiting - 30 second cooldown"""
-        if 'last_request' not in st.session_state:
-            st.session_state.last_request = 0
-        
         if time.time() - st.session_state.last_request < 30:
             remaining = int(30 - (time.time() - st.session_state.last_request))
             st.error(f"⏳ Please wait {remaining} seconds between assessments")
@@ -658,6 +983,95 @@ class ThreatModelingWebApp:
         st.session_state.last_request = time.time()
         return True
     
+    def reset_assessment(self):
+        """New Assessment callback: runs before any widget exists, so the search box can be cleared"""
+        # Defaults are re-applied by setup_session_state on the rerun
+        for key in ASSESSMENT_STATE_KEYS:
+            st.session_state.pop(key, None)
+        st.session_state.product_search = ""
+    
+    def select_suggestion(self):
+        """Pills callback: hand the picked suggestion to the assessment form"""
+        choice = st.session_state.get('suggestion_pill')
+        if choice:
+            st.session_state.selected_product = choice
+    
+    def get_remaining_tries(self):
+        """Remaining daily assessments from the shared in-memory tracker (no disk read)"""
+        return get_usage_tracker().get_remaining_tries()
+    
+    def _assessment_cache_key(self, product_name):
+        """Cache key: selected model plus the product name as validate_input sees it"""
+        provider_key = st.session_state.get('selected_llm_provider', 'ollama-deepseek-v3-1-671b-cloud')
+        return resolve_model_id(provider_key), " ".join(product_name.split()).lower()
+    
+    def get_cached_assessment(self, product_name):
+        """Return (report_content, all_data) from today's cache, if still fresh"""
+        cache = get_assessment_cache()
+        key = self._assessment_cache_key(product_name)
+        entry = cache.get(key)
+        if not entry:
+            return None
+        created_at, report_content, all_data = entry
+        # Expire after the TTL and at the usage tracker's day boundary
+        if (time.time() - created_at > ASSESSMENT_CACHE_TTL or
+                datetime.fromtimestamp(created_at).date() != datetime.now().date()):
+            cache.pop(key, None)
+            return None
+        return report_content, all_data
+    
+    def cache_assessment(self, product_name, report_content, all_data):
+        cache = get_assessment_cache()
+        key = self._assessment_cache_key(product_name)
+        # Re-inserting moves a replaced entry to the newest end
+        cache.pop(key, None)
+        cache[key] = (time.time(), report_content, all_data)
+        while len(cache) > ASSESSMENT_CACHE_MAX_ENTRIES:
+            try:
+                cache.popitem(last=False)
+            except KeyError:
+                # Another session emptied it first
+                break
+    
+    def clear_cached_assessment(self, product_name):
+        get_assessment_cache().pop(self._assessment_cache_key(product_name), None)
+    
+    def handle_submission(self, product_name, is_running):
+        """Start an assessment from the form, or show today's cached result"""
+        # Prevent concurrent assessments
+        if is_running:
+            st.warning("⏳ Assessment already in progress. Please wait for it to complete.")
+            st.stop()
+        
+        if not self.validate_input(product_name):
+            st.stop()
+        
+        # A cached assessment costs no LLM or API calls - show it straight away
+        # without the cooldown, quota check and extra running rerun
+        cached = self.get_cached_assessment(product_name)
+        if cached:
+            st.session_state.report_content, st.session_state.all_data = cached
+            st.session_state.product_name = product_name
+            st.session_state.assessment_complete = True
+            st.session_state.assessment_running = False
+            st.rerun()
+        
+        if not self.check_rate_limit():
+            st.stop()
+        
+        # Check daily limit using cached usage counter
+        if self.get_remaining_tries() <= 0:
+            st.error("🚫 Daily limit reached (10 assessments). Try again tomorrow.")
+            st.stop()
+        
+        # Reset assessment state before starting new one
+        st.session_state.assessment_complete = False
+        st.session_state.report_content = None
+        st.session_state.all_data = None
+        st.session_state.assessment_running = True
+        st.session_state.product_name = product_name
+        st.rerun()
+    
     def validate_input(self, product_name):
         """Enhanced input validation"""
         if not product_name:
@@ -669,26 +1083,27 @@ class ThreatModelingWebApp:
             st.error("Product name must be at least 3 characters long")
             return False
             
-        # Use whitelist approach for better security - allow common product name characters
-        import re
-        if not re.match(r'^[a-zA-Z0-9\s\-_\.\+\(\)\[\]\{\}\&\@\#\$\%\^\*\!\?\,\;\:\'\"]+$', cleaned_name):
-            st.error("Product name contains invalid characters. Please use standard alphanumeric characters and common symbols.")
-            return False
-            
         if len(cleaned_name) > 100:
             st.error("Product name is too long (maximum 100 characters)")
             return False
             
+        # Use whitelist approach for better security - allow common product name characters
+        if not PRODUCT_NAME_CHARS.issuperset(cleaned_name):
+            st.error("Product name contains invalid characters. Please use standard alphanumeric characters and common symbols.")
+            return False
+            
         return True
     
     def generate_basic_report(self, all_data):
         """Generate a basic fallback report when full generation fails"""
-        product_name = all_data.get('product_name', 'Unknown Product')
+        product_name = html.escape(all_data.get('product_name', 'Unknown Product'))
         threats = all_data.get('threats', [])
         
         threat_count = len(threats)
-        high_severity = len([t for t in threats if t.get('severity') == 'HIGH'])
-        critical_severity = len([t for t in threats if t.get('severity') == 'CRITICAL'])
+        severity_counts = Counter(t.get('severity') for t in threats)
+        high_severity = severity_counts['HIGH']
+        critical_severity = severity_counts['CRITICAL']
+        finding_items = ''.join(map(format_basic_finding, threats[:10]))
         
         return f"""
         <h1>Threat Assessment Report - {product_name}</h1>
@@ -704,7 +1119,7 @@ class ThreatModelingWebApp:
         <h2>Key Findings</h2>
         <p>The following threats were identified:</p>
         <ul>
-        {''.join([f'<li><strong>{t.get("title", "Unknown")}</strong> - {t.get("severity", "Unknown")} severity (CVE: {t.get("cve_id", "N/A")})</li>' for t in threats[:10]])}
+        {finding_items}
         </ul>
         
         <h2>Recommendations</h2>
@@ -719,6 +1134,27 @@ class ThreatModelingWebApp:
         <p><em>Note: This is a basic report generated due to processing constraints. For detailed analysis, please try the assessment again.</em></p>
         """
     
+    def generate_no_threats_report(self, product_name, product_info):
+        """Generate the report for an assessment that found no threats"""
+        product_type = product_info.get('type', 'unknown') if isinstance(product_info, dict) else 'unknown'
+        product_name = html.escape(product_name)
+        
+        return f"""
+        <h1>Threat Assessment Report - {product_name}</h1>
+        
+        <h2>Executive Summary</h2>
+        <p>No vulnerabilities or threats relevant to <strong>{product_name}</strong> ({html.escape(str(product_type))}) were found in the available threat intelligence sources.</p>
+        
+        <h2>Recommendations</h2>
+        <ul>
+            <li>Verify the exact product name and version (see <a href="https://nvd.nist.gov/products/cpe/search">NVD CPE Search</a>)</li>
+            <li>Keep software updated with latest security patches</li>
+            <li>Conduct regular security assessments</li>
+        </ul>
+        
+        <p><em>Note: Control mapping and detailed analysis were skipped because no threats were identified.</em></p>
+        """
+    
     async def _fallback_product_info(self, product_name: str) -> Dict[str, Any]:
         """Fallback product information when main analysis fails"""
         return {
@@ -774,19 +1210,21 @@ class ThreatModelingWebApp:
         # Clear session from URL
         self.session_manager.clear_session_url()
     
+    def get_app_password_hash(self):
+        """SHA-256 of the configured password, looked up once per session"""
+        if '_app_password_hash' not in st.session_state:
+            try:
+                app_password = st.secrets["APP_PASSWORD"]
+            except (KeyError, FileNotFoundError, AttributeError):
+                app_password = os.getenv('APP_PASSWORD')
+            # Don't cache a missing password so a later configuration is picked up
+            if not app_password:
+                return None
+            st.session_state._app_password_hash = hashlib.sha256(app_password.encode()).digest()
+        return st.session_state._app_password_hash
+    
     def check_authentication(self):
         """Password authentication with session management and brute force protection"""
-        if 'authenticated' not in st.session_state:
-            st.session_state.authenticated = False
-        if 'login_attempts' not in st.session_state:
-            st.session_state.login_attempts = 0
-        if 'login_lockout_time' not in st.session_state:
-            st.session_state.login_lockout_time = 0
-        if 'login_timestamp' not in st.session_state:
-            st.session_state.login_timestamp = 0
-        if 'last_activity' not in st.session_state:
-            st.session_state.last_activity = 0
-            
         # Try to restore session from URL parameters on every check
         if not st.session_state.get('authenticated', False):
             if self.session_manager.restore_session_from_url():
@@ -806,10 +1244,10 @@ class ThreatModelingWebApp:
             </div>
             """, unsafe_allow_html=True)
             
-            # Check if locked out
-            current_time = time.time()
-            if st.session_state.login_lockout_time > current_time:
-                remaining_time = int(st.session_state.login_lockout_time - current_time)
+            # Check if locked out (monotonic clock - a wall-clock change can't end it early)
+            now = time.monotonic()
+            if st.session_state.login_lockout_time > now:
+                remaining_time = int(st.session_state.login_lockout_time - now)
                 st.error(f"🔒 Too many failed attempts. Try again in {remaining_time} seconds.")
                 st.stop()
             
@@ -833,16 +1271,14 @@ class ThreatModelingWebApp:
                         login_submitted = st.form_submit_button("🚀 Login", type="primary", use_container_width=True)
                     
                     if login_submitted:
-                        try:
-                            app_password = st.secrets["APP_PASSWORD"]
-                        except:
-                            app_password = os.getenv('APP_PASSWORD')
+                        app_password_hash = self.get_app_password_hash()
                         
-                        if not app_password:
+                        if not app_password_hash:
                             st.error("🔒 APP_PASSWORD not configured. Contact administrator.")
                             st.stop()
                         
-                        if password == app_password:
+                        password_hash = hashlib.sha256(password.encode()).digest()
+                        if hmac.compare_digest(password_hash, app_password_hash):
                             current_time = time.time()
                             st.session_state.authenticated = True
                             st.session_state.login_attempts = 0  # Reset on success
@@ -858,30 +1294,111 @@ class ThreatModelingWebApp:
                             
                             if st.session_state.login_attempts >= 5:
                                 # Lock out for 5 minutes
-                                st.session_state.login_lockout_time = current_time + 300
+                                st.session_state.login_lockout_time = time.monotonic() + 300
                                 st.error("🔒 Too many failed attempts. Locked out for 5 minutes.")
                             else:
                                 remaining = 5 - st.session_state.login_attempts
                                 st.error(f"❌ Invalid password. {remaining} attempts remaining.")
             st.stop()
     
+    @st.fragment
+    def render_downloads(self):
+        """Completion notice and report downloads; reruns on its own when a button is used"""
+        st.success("✅ Assessment Complete!")
+        
+        # Download buttons
+        if st.session_state.report_content:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # The download helpers sanitize the whole filename
+            product_name = st.session_state.product_name
+            
+            # PDF Download
+            pdf_filename = f"{product_name}_assessment_{timestamp}.pdf"
+            self.create_pdf_download(
+                st.session_state.report_content, 
+                pdf_filename
+            )
+            
+            # HTML Download
+            html_filename = f"{product_name}_assessment_{timestamp}.html"
+            html_filename, html_bytes = self.create_html_download(
+                st.session_state.report_content, 
+                html_filename
+            )
+            st.download_button(
+                label="🌐 Download Interactive Report (HTML)",
+                data=html_bytes,
+                file_name=html_filename,
+                mime="text/html",
+                use_container_width=True
+            )
+    
+    @st.fragment
+    def render_results(self):
+        """Threat summary, report viewer and result actions
+        
+        Runs as a fragment so interacting with the report only reruns this
+        section; the actions below use st.rerun() to rerun the whole app.
+        """
+        st.markdown("---")
+        
+        # Threat summary
+        self.display_threat_summary(st.session_state.all_data)
+        
+        st.markdown("---")
+        
+        # Report display
+        st.header("📊 Threat Assessment Report")
+        
+        # Display report in expandable section with Mermaid support
+        with st.expander("📋 View Full Report", expanded=True):
+            # Professional report display with dynamic height; the composed view is
+            # kept next to the report it was built from, so reruns skip even the
+            # cache lookup (which would hash the whole report) until it changes
+            report_content = st.session_state.report_content
+            report_view = st.session_state.get('_report_view')
+            if report_view is None or report_view[0] is not report_content:
+                report_view = (report_content, *build_report_view(report_content))
+                st.session_state._report_view = report_view
+            _, mermaid_html, estimated_height = report_view
+            
+            import streamlit.components.v1 as components
+            components.html(mermaid_html, height=estimated_height, scrolling=True)
+        
+        # Re-run the same product, bypassing the assessment cache
+        if st.button("♻️ Force Refresh", help="Run this assessment again instead of reusing today's result"):
+            if not self.check_rate_limit():
+                st.stop()
+            if self.get_remaining_tries() <= 0:
+                st.error("🚫 Daily limit reached (10 assessments). Try again tomorrow.")
+                st.stop()
+            self.clear_cached_assessment(st.session_state.product_name)
+            st.session_state.assessment_complete = False
+            st.session_state.report_content = None
+            st.session_state.all_data = None
+            st.session_state.assessment_running = True
+            st.rerun()
+        
+        # Reset button
+        if st.button("🔄 New Assessment", on_click=self.reset_assessment):
+            # The callback only reran this fragment; redraw the whole page
+            st.rerun()
+    
     def main(self):
         """Main Streamlit application"""
         
         # Check authentication first
         self.check_authentication()
         
+        # Session flags read several times per render; any change reruns the script
+        state = st.session_state
+        show_methodology = state.get('show_methodology', False)
+        is_running = state.get('assessment_running', False)
+        
 
         
         # Header - keep consistent color
-        header_class = "main-header"
-        
-        st.markdown(f"""
-        <div class="{header_class}">
-            <h1>🛡️ Cybersecurity Threat Assessment</h1>
-            <p>AI-Powered Threat Modeling & Risk Analysis</p>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(MAIN_HEADER_HTML, unsafe_allow_html=True)
         
         # Sidebar
         with st.sidebar:
@@ -892,27 +1409,18 @@ class ThreatModelingWebApp:
             
             providers = get_available_providers()
             
-            # Create provider options with status
-            provider_options = []
-            provider_labels = []
-            
-            for provider_key, provider_info in providers.items():
-                provider_options.append(provider_key)
-                status_icon = "✅" if "Available" in provider_info["status"] else "❌"
-                description = provider_info.get('description', '')
-                provider_labels.append(f"{status_icon} {provider_info['model']} - {description}")
+            # Provider options with status labels (cached with the provider status)
+            provider_options, provider_labels, provider_index = get_provider_choices()
             
             # Provider selection
             if provider_options:
-                selected_idx = 0
                 current_provider = st.session_state.get('selected_llm_provider', 'ollama-deepseek-v3-1-671b-cloud')
-                if current_provider in provider_options:
-                    selected_idx = provider_options.index(current_provider)
+                selected_idx = provider_index.get(current_provider, 0)
                 
                 selected_provider = st.selectbox(
                     "Select AI Model:",
                     options=provider_options,
-                    format_func=lambda x: provider_labels[provider_options.index(x)],
+                    format_func=provider_labels.get,
                     index=selected_idx,
                     key="llm_provider_select"
                 )
@@ -954,37 +1462,13 @@ class ThreatModelingWebApp:
                 st.markdown(f"{i}. {step}")
             
             # Usage tracker - dynamically updated
-            usage_tracker = st.session_state.usage_tracker
-            remaining_tries = usage_tracker.get_remaining_tries()
+            remaining_tries = self.get_remaining_tries()
             
             st.markdown("### 🔒 Daily Assessment Quota")
             
             # Dynamic color based on remaining tries
-            if remaining_tries > 5:
-                bg_color = "#e8f5e8"
-                border_color = "#4caf50"
-                text_color = "#2e7d32"
-            elif remaining_tries > 2:
-                bg_color = "#fff3e0"
-                border_color = "#ff9800"
-                text_color = "#e65100"
-            else:
-                bg_color = "#ffe1e9"
-                border_color = "#ffb1c7"
-                text_color = "#9b2542"
-            
-            st.markdown(f"""
-            <div style="
-                background-color: {bg_color};
-                border-radius: 4px;
-                border: 1px solid {border_color};
-                color: {text_color};
-                padding: 16px;
-                margin-top: 8px;
-            ">
-                <div><strong>{remaining_tries}</strong> assessments remaining</div>
-            </div>
-            """, unsafe_allow_html=True)
+            quota_level = 0 if remaining_tries > 5 else 1 if remaining_tries > 2 else 2
+            st.markdown(QUOTA_TEMPLATES[quota_level].format(n=remaining_tries), unsafe_allow_html=True)
             
 
             
@@ -996,7 +1480,7 @@ class ThreatModelingWebApp:
                 st.session_state.show_methodology = True
                 st.rerun()
             
-            if st.session_state.get('show_methodology', False):
+            if show_methodology:
                 if st.button("❌ Close Methodology", use_container_width=True):
                     st.session_state.show_methodology = False
                     st.rerun()
@@ -1010,7 +1494,7 @@ class ThreatModelingWebApp:
 
         
         # Check if methodology should be displayed
-        if st.session_state.get('show_methodology', False):
+        if show_methodology:
             # Back to assessment link
             if st.button("← Back to Assessment", type="secondary"):
                 st.session_state.show_methodology = False
@@ -1021,11 +1505,11 @@ class ThreatModelingWebApp:
             
             methodology_path = os.path.join(os.path.dirname(__file__), "methodology.html")
             if os.path.exists(methodology_path):
-                with open(methodology_path, 'r', encoding='utf-8') as f:
-                    methodology_content = f.read()
+                methodology_content = load_methodology(methodology_path, os.path.getmtime(methodology_path))
                 
                 # Display methodology with dynamic height and scrolling enabled
-                st.components.v1.html(methodology_content, height=1200, scrolling=True)
+                import streamlit.components.v1 as components
+                components.html(methodology_content, height=1200, scrolling=True)
             else:
                 st.error("Methodology file not found")
             
@@ -1061,39 +1545,56 @@ class ThreatModelingWebApp:
                     refresh_search = st.button("🔍 Search", help="Get AI product suggestions")
                 
                 # Trigger search on new input or manual refresh
-                should_search = (
+                should_search = refresh_search or (
                     'suggestions' not in st.session_state or 
-                    st.session_state.get('last_search') != product_input or
-                    refresh_search
+                    st.session_state.get('last_search') != product_input
                 )
                 
+                # Extending the previous input ("apache" -> "apache tom") can usually be
+                # answered from the suggestions already shown, without another LLM call
+                last_search = st.session_state.get('last_search')
+                if should_search and not refresh_search and last_search:
+                    typed = product_input.lower()
+                    if typed.startswith(last_search.lower()):
+                        narrowed = tuple(
+                            name for name in st.session_state.get('suggestions', ())
+                            if name.lower().startswith(typed) and name != product_input
+                        )
+                        if narrowed:
+                            st.session_state.suggestions = narrowed
+                            st.session_state.last_search = product_input
+                            should_search = False
+                
+                if should_search and not refresh_search:
+                    # Debounce automatic searches by waiting out the rest of the window
+                    # instead of dropping the input: a newer input requests a rerun,
+                    # which stops this run at its next Streamlit call before the LLM
+                    # call (the Search button always goes through)
+                    since_last_search = time.monotonic() - st.session_state.get('_last_search_ts', 0.0)
+                    if since_last_search < SUGGESTION_DEBOUNCE_SECONDS:
+                        time.sleep(SUGGESTION_DEBOUNCE_SECONDS - since_last_search)
+                
                 if should_search:
-                    try:
-                        api_key = st.secrets["GEMINI_API_KEY"]
-                    except:
-                        api_key = os.getenv('GEMINI_API_KEY')
-                    
                     provider_key = st.session_state.get('selected_llm_provider', 'ollama-deepseek-v3-1-671b-cloud')
-                    providers = get_available_providers()
-                    
-                    if provider_key in providers:
-                        provider_info = providers[provider_key]
-                        llm = LLMClient('ollama', model=provider_info['model_id'])
-                    else:
-                        llm = LLMClient('ollama', model='deepseek-v3.1:671b-cloud')
+                    model_id = resolve_model_id(provider_key)
+                    llm, agents = get_agents(model_id)
                     if llm.is_available():
+                        st.session_state._last_search_ts = time.monotonic()
+                        normalized_input = product_input.strip().lower()
+                        if refresh_search:
+                            # Search always asks the model again rather than the cache
+                            get_product_suggestions.clear(model_id, normalized_input)
                         with st.status("🤖 AI is completing your input...", expanded=False):
-                            product_agent = ProductInfoAgent(llm)
                             try:
-                                raw_suggestions = asyncio.run(product_agent.smart_product_completion(product_input))
-                                # Convert to dict format for consistency
-                                if raw_suggestions and len(raw_suggestions) > 0:
-                                    suggestions = [{'name': s, 'source': 'AI Completion'} for s in raw_suggestions if s and s != product_input]
-                                else:
-                                    suggestions = []
+                                suggestions = tuple(
+                                    name for name in get_product_suggestions(model_id, normalized_input)
+                                    if name != product_input
+                                )
+                            except LookupError:
+                                suggestions = ()
                             except Exception as e:
                                 st.error(f"Error getting suggestions: {e}")
-                                suggestions = []
+                                suggestions = ()
                             st.session_state.suggestions = suggestions
                             st.session_state.last_search = product_input
                 
@@ -1101,29 +1602,16 @@ class ThreatModelingWebApp:
                 if 'suggestions' in st.session_state and st.session_state.suggestions:
                     st.success(f"✅ **Found {len(st.session_state.suggestions)} product suggestions:**")
                     
-                    # Display suggestions as clickable buttons
-                    cols = st.columns(min(len(st.session_state.suggestions), 2))
-                    for i, suggestion in enumerate(st.session_state.suggestions):
-                        with cols[i % 2]:
-                            # Handle both dict and string formats for backward compatibility
-                            if isinstance(suggestion, dict):
-                                name = suggestion['name']
-                                source = suggestion.get('source', 'AI Completion')
-                                button_text = f"🎯 {name}"
-                                help_text = f"From {source}"
-                            else:
-                                name = suggestion
-                                button_text = f"🎯 {name}"
-                                help_text = "AI suggested product name"
-                            
-                            if st.button(
-                                button_text,
-                                key=f"suggestion_{i}",
-                                use_container_width=True,
-                                help=help_text
-                            ):
-                                st.session_state.selected_product = name
-                                st.rerun()
+                    # One pills widget for all suggestions instead of a button per suggestion
+                    st.pills(
+                        "Suggestions",
+                        options=st.session_state.suggestions,
+                        format_func=lambda name: f"🎯 {name}",
+                        key="suggestion_pill",
+                        on_change=self.select_suggestion,
+                        label_visibility="collapsed",
+                        help="AI suggested product names"
+                    )
                 
                 elif len(product_input) > 2 and st.session_state.get('last_search') == product_input:
                     st.info("💡 **No CVE data found for this product name**")
@@ -1133,9 +1621,10 @@ class ThreatModelingWebApp:
                 elif len(product_input) > 2:
                     st.info("💡 **Click 🔍 Search to get AI product suggestions**")
             
-            # Assessment form
-            if product_input:
-                with st.form("assessment_form"):
+            # Assessment form - a single form whose contents depend on the input,
+            # so Streamlit keeps the same form widget across reruns
+            with st.form("assessment_form"):
+                if product_input:
                     # Initialize form input with current product_input if not set
                     if 'form_product_name' not in st.session_state:
                         st.session_state.form_product_name = product_input
@@ -1154,7 +1643,6 @@ class ThreatModelingWebApp:
                     
                     col_a, col_b = st.columns([4, 1])
                     with col_a:
-                        is_running = st.session_state.get('assessment_running', False)
                         button_text = "⏳ Processing Assessment..." if is_running else "🚀 Start Assessment"
                         submit_button = st.form_submit_button(
                             button_text,
@@ -1164,151 +1652,76 @@ class ThreatModelingWebApp:
                     with col_b:
                         example_button = st.form_submit_button(
                             "📝 Try Example",
-                            disabled=st.session_state.get('assessment_running', False)
+                            disabled=is_running
                         )
                     
                     product_name = final_product
-            else:
-                # Show example button when no input
-                with st.form("example_form"):
+                else:
+                    # Show example button when no input
                     st.info("Enter a product name above or try an example")
                     submit_button = False
                     example_button = st.form_submit_button(
                         "📝 Try Example: Visual Studio Code",
-                        disabled=st.session_state.get('assessment_running', False)
+                        disabled=is_running
                     )
                     product_name = None
             
             # Handle form submission
             if submit_button and product_name:
-                # Prevent concurrent assessments
-                if st.session_state.get('assessment_running', False):
-                    st.warning("⏳ Assessment already in progress. Please wait for it to complete.")
-                    st.stop()
-                    
-                # Product name is now directly from the form input
-                if not self.check_rate_limit():
-                    st.stop()
-                if not self.validate_input(product_name):
-                    st.stop()
-                
-                # Check daily limit using usage tracker
-                usage_tracker = st.session_state.usage_tracker
-                if usage_tracker.get_remaining_tries() <= 0:
-                    st.error("🚫 Daily limit reached (10 assessments). Try again tomorrow.")
-                    st.stop()
-                
-                # Reset assessment state before starting new one
-                st.session_state.assessment_complete = False
-                st.session_state.report_content = None
-                st.session_state.all_data = None
-                st.session_state.assessment_running = True
-                st.session_state.product_name = product_name
-                st.rerun()
-            
+                self.handle_submission(product_name, is_running)
             elif example_button:
-                # Prevent concurrent assessments
-                if st.session_state.get('assessment_running', False):
-                    st.warning("⏳ Assessment already in progress. Please wait for it to complete.")
-                    st.stop()
-                    
-                if not self.check_rate_limit():
-                    st.stop()
-                
-                # Check daily limit using usage tracker
-                usage_tracker = st.session_state.usage_tracker
-                if usage_tracker.get_remaining_tries() <= 0:
-                    st.error("🚫 Daily limit reached (10 assessments). Try again tomorrow.")
-                    st.stop()
-                
-                # Reset assessment state before starting new one
-                st.session_state.assessment_complete = False
-                st.session_state.report_content = None
-                st.session_state.all_data = None
-                st.session_state.assessment_running = True
-                st.session_state.product_name = "Visual Studio Code"
-                st.rerun()
+                self.handle_submission("Visual Studio Code", is_running)
         
         with col2:
             st.header("ℹ️ About")
             with st.container(border=True):
-                st.markdown("""
-                **🎯 Latest Attack Intelligence:** Prioritizes most current attack patterns and threat actor campaigns from latest available sources
-                
-                **📊 17-Source Intelligence:** NVD CVE, GitHub Security, CISA Alerts, Google CSE (12 databases), Microsoft Security with authority weighting
-                """)
+                st.markdown(ABOUT_SUMMARY_MD)
                 
                 with st.expander("🔍 View More Details"):
-                    st.markdown("""
-                    **🔍 Scenario-Specific Modeling:**
-                    - **Dynamic Scenario Types:** Remote Code Execution, Privilege Escalation, Data Exfiltration, Availability, Supply Chain attacks
-                    - **Threat-Matched Attack Flows:** Each scenario gets unique attack flow diagrams based on actual threat intelligence
-                    - **CVE-Based Analysis:** Reconnaissance → Initial Access → Execution → Persistence → Privilege Escalation → Defense Evasion → Impact
-                    
-                    **🏆 Enhanced Intelligence:**
-                    - **Multi-Agent Ranking:** CVE Agent (CVSS + recency), Exploit Agent (weaponization status), Authority Agent (source credibility), Relevance Agent (product matching)
-                    - **Ensemble Scoring:** Authority weight × Recency factor × CVSS normalized × Relevance score
-                    - **Priority Algorithm:** Official sources (3x weight) → Verified sources (2x) → Community (1x) with exploit availability boost
-                    - **Accuracy Enhancement:** ThreatAccuracyEnhancer filters by exploit availability, patch status, attack complexity, detection difficulty
-                    """)
+                    st.markdown(ABOUT_DETAILS_MD)
             
             if st.session_state.assessment_complete:
-                st.success("✅ Assessment Complete!")
-                
-                # Download buttons
-                if st.session_state.report_content:
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    safe_product_name = st.session_state.product_name.replace(' ', '_').replace('/', '_').replace('\\', '_')
-                    
-                    # PDF Download
-                    pdf_filename = f"{safe_product_name}_assessment_{timestamp}.pdf"
-                    self.create_pdf_download(
-                        st.session_state.report_content, 
-                        pdf_filename
-                    )
-                    
-                    # HTML Download
-                    html_filename = f"{safe_product_name}_assessment_{timestamp}.html"
-                    html_link = self.create_html_download(
-                        st.session_state.report_content, 
-                        html_filename
-                    )
-                    st.markdown(html_link, unsafe_allow_html=True)
+                self.render_downloads()
         
         # Run assessment if in running state
         if st.session_state.get('assessment_running') and not st.session_state.get('assessment_complete'):
             product_name = st.session_state.get('product_name', '')
-            usage_tracker = st.session_state.usage_tracker
+            usage_tracker = get_usage_tracker()
+            
+            # Reuse a completed assessment of the same product from today
+            cached = self.get_cached_assessment(product_name)
+            if cached:
+                st.session_state.report_content, st.session_state.all_data = cached
+                st.session_state.assessment_complete = True
+                st.session_state.assessment_running = False
+                st.rerun()
             
             try:
-                # Use asyncio.run with timeout wrapper
+                # Run on the session event loop with a timeout wrapper
                 async def run_with_timeout():
-                    return await asyncio.wait_for(
-                        self.run_assessment(product_name),
-                        timeout=300  # 5 minute total timeout
-                    )
+                    async with asyncio.timeout(300):  # 5 minute total timeout
+                        return await self.run_assessment(product_name)
                 
-                report_content, all_data = asyncio.run(run_with_timeout())
+                report_content, all_data = self.run_async(run_with_timeout())
                 
                 if report_content and all_data:
+                    self.cache_assessment(product_name, report_content, all_data)
                     # Increment usage after successful assessment
                     usage_tracker.increment_usage()
                     st.session_state.report_content = report_content
                     st.session_state.all_data = all_data
                     st.session_state.assessment_complete = True
-                    st.session_state.assessment_running = False
                 else:
                     # Assessment failed or was terminated
-                    st.session_state.assessment_running = False
                     st.error("Assessment failed or was terminated. Please try again.")
-            except asyncio.TimeoutError:
-                st.session_state.assessment_running = False
+            except TimeoutError:
                 st.error("Assessment timed out after 5 minutes. Please try again with a different product.")
             except Exception as e:
-                st.session_state.assessment_running = False
                 st.error(f"Assessment error: {str(e)}")
-                import traceback
-                print(f"Full error trace: {traceback.format_exc()}")
+                logging.exception("Full error trace")
+            finally:
+                # A started run is marked finished here, whatever the outcome
+                st.session_state.assessment_running = False
             
             # Only rerun if assessment completed successfully
             if st.session_state.get('assessment_complete'):
@@ -1316,189 +1729,7 @@ class ThreatModelingWebApp:
         
         # Display results if assessment is complete
         if st.session_state.assessment_complete and st.session_state.report_content:
-            st.markdown("---")
-            
-            # Threat summary
-            self.display_threat_summary(st.session_state.all_data)
-            
-            st.markdown("---")
-            
-            # Report display
-            st.header("📊 Threat Assessment Report")
-            
-            # Display report in expandable section with Mermaid support
-            with st.expander("📋 View Full Report", expanded=True):
-                # Professional report display with dynamic height
-                mermaid_html = f"""
-                <!DOCTYPE html>
-                <html>
-                <head>
-                    <meta charset="UTF-8">
-                    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                    <meta http-equiv="Content-Security-Policy" content="default-src 'self'; script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; style-src 'self' 'unsafe-inline'; frame-ancestors 'self';">
-                    <style>
-                        body {{
-                            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                            background-color: #ffffff;
-                            color: #262730;
-                            margin: 0;
-                            padding: 0;
-                            line-height: 1.6;
-                            width: 100%;
-                        }}
-                        .report-container {{
-                            width: 100%;
-                            margin: 0;
-                            padding: 0;
-                            background: #ffffff;
-                            box-sizing: border-box;
-                            position: absolute;
-                            left: 0;
-                            top: 0;
-                        }}
-                        h1 {{
-                            color: #2c3e50;
-                            border-bottom: 3px solid #667eea;
-                            padding-bottom: 10px;
-                            margin-bottom: 20px;
-                        }}
-                        h2 {{
-                            color: #34495e;
-                            margin-top: 30px;
-                            border-left: 4px solid #667eea;
-                            padding-left: 15px;
-                        }}
-                        h3 {{
-                            color: #2c3e50;
-                            margin-top: 25px;
-                        }}
-                        .critical {{
-                            background-color: #fee;
-                            color: #c53030;
-                            padding: 2px 6px;
-                            border-radius: 4px;
-                            font-weight: bold;
-                        }}
-                        .mitre {{
-                            background-color: #e6f3ff;
-                            color: #1a365d;
-                            padding: 2px 6px;
-                            border-radius: 3px;
-                            font-family: monospace;
-                            font-weight: bold;
-                        }}
-                        .mermaid {{
-                            text-align: center;
-                            margin: 20px 0;
-                            padding: 20px;
-                            background-color: #f8f9fa;
-                            border: 1px solid #dee2e6;
-                            border-radius: 5px;
-                        }}
-                    </style>
-                    <script src="https://cdn.jsdelivr.net/npm/mermaid@10/dist/mermaid.min.js"></script>
-                </head>
-                <body>
-                    <div class="report-container">
-                        {st.session_state.report_content}
-                    </div>
-                    
-                    <script>
-                        mermaid.initialize({{
-                            startOnLoad: true,
-                            theme: 'default',
-                            securityLevel: 'strict',
-                            flowchart: {{
-                                useMaxWidth: true,
-                                htmlLabels: false
-                            }},
-                            themeVariables: {{
-                                background: '#ffffff',
-                                primaryColor: '#667eea',
-                                primaryTextColor: '#262730',
-                                fontFamily: 'Arial, sans-serif'
-                            }}
-                        }});
-                        
-                        function renderMermaid() {{
-                            const mermaidElements = document.querySelectorAll('.mermaid');
-                            mermaidElements.forEach((element, index) => {{
-                                if (!element.getAttribute('data-processed')) {{
-                                    try {{
-                                        mermaid.render(`mermaid-${{index}}`, element.textContent, (svgCode) => {{
-                                            element.innerHTML = svgCode;
-                                            element.setAttribute('data-processed', 'true');
-                                        }});
-                                    }} catch (error) {{
-                                        console.error('Mermaid render error:', error);
-                                        element.innerHTML = '<p>Diagram rendering failed</p>';
-                                    }}
-                                }}
-                            }});
-                        }}
-                        
-                        function adjustHeight() {{
-                            const body = document.body;
-                            const html = document.documentElement;
-                            const height = Math.max(
-                                body.scrollHeight,
-                                body.offsetHeight,
-                                html.clientHeight,
-                                html.scrollHeight,
-                                html.offsetHeight
-                            );
-                            
-                            window.parent.postMessage({{
-                                type: 'streamlit:setFrameHeight',
-                                height: height + 100
-                            }}, '*');
-                        }}
-                        
-                        document.addEventListener('DOMContentLoaded', function() {{
-                            setTimeout(() => {{
-                                renderMermaid();
-                                setTimeout(adjustHeight, 1000);
-                            }}, 500);
-                        }});
-                        
-                        window.addEventListener('load', () => {{
-                            setTimeout(() => {{
-                                renderMermaid();
-                                setTimeout(adjustHeight, 1000);
-                            }}, 1000);
-                        }});
-                        
-                        setInterval(adjustHeight, 3000);
-                    </script>
-                </body>
-                </html>
-                """
-                
-                # Calculate dynamic height
-                content_length = len(st.session_state.report_content)
-                word_count = len(st.session_state.report_content.split())
-                diagram_count = st.session_state.report_content.count('mermaid')
-                estimated_height = max(word_count * 2 + diagram_count * 400 + 500, 1000)
-                
-                st.components.v1.html(mermaid_html, height=estimated_height, scrolling=True)
-            
-            # Reset button
-            if st.button("🔄 New Assessment"):
-                # Reset all assessment-related session state
-                keys_to_reset = [
-                    'assessment_complete', 'assessment_running', 'report_content', 
-                    'all_data', 'product_name', 'suggestions', 'selected_product', 
-                    'last_search', 'product_search', 'last_request', 'form_product_name'
-                ]
-                
-                for key in keys_to_reset:
-                    if key in st.session_state:
-                        del st.session_state[key]
-                
-                # Reset form state by clearing the text input
-                st.session_state.product_search = ""
-                
-                st.rerun()
+            self.render_results()
 
 # Run the app
 if __name__ == "__main__":
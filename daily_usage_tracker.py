@@ -1,5 +1,7 @@
 import json
 import os
+import queue
+import threading
 from datetime import datetime
 
 class DailyUsageTracker:
@@ -7,6 +9,11 @@ class DailyUsageTracker:
         self.file_path = file_path
         self.daily_limit = daily_limit
         self.usage_data = self._load_usage_data()
+        # One tracker can be shared by concurrent sessions
+        self._lock = threading.Lock()
+        # Snapshots waiting to be written by the persistence thread
+        self._persist_queue = queue.Queue()
+        self._writer = None
 
     def _load_usage_data(self):
         try:
@@ -22,20 +29,37 @@ class DailyUsageTracker:
         except (FileNotFoundError, json.JSONDecodeError, ValueError):
             return {"date": None, "count": 0}
 
-    def _save_usage_data(self):
-        with open(self.file_path, "w") as file:
-            json.dump(self.usage_data, file)
+    def _save_usage_data_async(self):
+        # Queue a snapshot so the caller never waits on disk; one writer thread
+        # keeps the writes in order
+        self._persist_queue.put_nowait(dict(self.usage_data))
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._drain_persist_queue, daemon=True)
+            self._writer.start()
+
+    def _drain_persist_queue(self):
+        while True:
+            snapshot = self._persist_queue.get()
+            # Only the newest snapshot matters when several are waiting
+            while not self._persist_queue.empty():
+                snapshot = self._persist_queue.get_nowait()
+            try:
+                with open(self.file_path, "w") as file:
+                    json.dump(snapshot, file)
+            except OSError as e:
+                print(f"Usage tracker save failed: {e}")
 
     def increment_usage(self):
         today = datetime.now().strftime("%Y-%m-%d")
-        if self.usage_data.get("date") != today:
-            self.usage_data = {"date": today, "count": 0}
-        
-        if self.usage_data["count"] < self.daily_limit:
-            self.usage_data["count"] += 1
-            self._save_usage_data()
-            return True
-        return False
+        with self._lock:
+            if self.usage_data.get("date") != today:
+                self.usage_data = {"date": today, "count": 0}
+            
+            if self.usage_data["count"] < self.daily_limit:
+                self.usage_data["count"] += 1
+                self._save_usage_data_async()
+                return True
+            return False
 
     def get_remaining_tries(self):
         today = datetime.now().strftime("%Y-%m-%d")
@@ -1,9 +1,14 @@
 import os
+import asyncio
+import functools
+import threading
 import google.generativeai as genai
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import streamlit as st
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Callable
 
 # Configure logging
 logging.basicConfig(
@@ -12,6 +17,18 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+@functools.lru_cache(maxsize=1)
+def get_http_session() -> requests.Session:
+    """Shared HTTP session so HTTPS API calls reuse keep-alive connections"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(total=2, backoff_factor=0.3)
+    )
+    session.mount("https://", adapter)
+    return session
+
 class LLMClient:
     """Unified LLM client supporting Gemini and Perplexity"""
     
@@ -87,6 +104,49 @@ class LLMClient:
         
         self.model = "ollama-client"
         self.model_name = self.selected_model
+        # Resolved lazily on the first call and reused, see _get_ollama_client()
+        self._ollama_client = None
+        self._ollama_lock = threading.Lock()
+    
+    def _get_ollama_client(self):
+        """Local or cloud Ollama client, resolved once and shared by all calls
+        
+        Resolving probes the local server with client.list(), so doing it per
+        call would add a round trip (and a new HTTP connection) to every request.
+        """
+        import ollama
+        
+        with self._ollama_lock:
+            if self._ollama_client is not None:
+                return self._ollama_client
+            
+            client = None
+            
+            # Try local Ollama first
+            try:
+                client = ollama.Client()
+                # Test connection
+                client.list()
+                logging.info("Using local Ollama")
+            except Exception:
+                client = None
+            
+            # If local fails and we have API key, try cloud
+            if client is None and self.api_key:
+                try:
+                    client = ollama.Client(
+                        host='https://ollama.com',
+                        headers={'Authorization': self.api_key}
+                    )
+                    logging.info("Using Ollama Cloud")
+                except Exception:
+                    client = None
+            
+            if client is None:
+                raise Exception("Ollama not available locally or in cloud")
+            
+            self._ollama_client = client
+            return client
     
     def is_available(self) -> bool:
         """Check if the LLM client is available"""
@@ -109,8 +169,13 @@ class LLMClient:
                 "provider": self.provider.title()
             }
     
-    async def generate(self, prompt: str, max_tokens: int = 150) -> str:
-        """Generate response using the configured provider"""
+    async def generate(self, prompt: str, max_tokens: int = 150,
+                       on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        """Generate response using the configured provider
+        
+        on_chunk, if given, is called on the event loop with each piece of text
+        as it is streamed (Ollama only); the full response is still returned.
+        """
         if not self.is_available():
             return f"Error: {self.provider.title()} API key not available"
         
@@ -123,7 +188,7 @@ class LLMClient:
             elif self.provider == "perplexity":
                 result = await self._call_perplexity(prompt, max_tokens)
             elif self.provider == "ollama":
-                result = await self._call_ollama(prompt, max_tokens)
+                result = await self._call_ollama(prompt, max_tokens, on_chunk)
                 
                 # Return error result for Ollama failures
                 if ("error" in result.lower() or "timeout" in result.lower() or 
@@ -143,10 +208,28 @@ class LLMClient:
             logging.error(error_msg)
             return error_msg
     
+    async def generate_batch(self, prompts: List[str], max_tokens: int = 150,
+                             max_concurrency: int = 4, timeout: Optional[float] = None) -> List[str]:
+        """Generate responses for independent prompts concurrently
+        
+        Results are returned in prompt order. Like generate(), failures come
+        back as error strings rather than exceptions.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def generate_one(prompt: str) -> str:
+            async with semaphore:
+                try:
+                    async with asyncio.timeout(timeout):
+                        return await self.generate(prompt, max_tokens)
+                except TimeoutError:
+                    logging.warning(f"LLM batch call ({self.provider}) timed out after {timeout}s")
+                    return f"Error: {self.provider.title()} request timed out"
+        
+        return await asyncio.gather(*(generate_one(prompt) for prompt in prompts))
+    
     async def _call_perplexity(self, prompt: str, max_tokens: int) -> str:
         """Call Perplexity API with better error handling"""
-        import requests
-        import asyncio
         from datetime import datetime
         
         # Log the start of the call
@@ -183,7 +266,7 @@ class LLMClient:
             try:
                 logging.info(f"Making Perplexity request with {len(prompt)} chars")
                 # Perplexity can be slow for complex queries - use longer timeout
-                response = requests.post(
+                response = get_http_session().post(
                     self.base_url, 
                     json=data, 
                     headers=headers, 
@@ -238,54 +321,32 @@ class LLMClient:
         
         # Run the synchronous request in a thread pool
         try:
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
             result = await loop.run_in_executor(None, make_request)
             return result
         except Exception as e:
             logging.error(f"Async execution error: {str(e)}")
             return f"Execution error: {str(e)}"
     
-    async def _call_ollama(self, prompt: str, max_tokens: int) -> str:
+    async def _call_ollama(self, prompt: str, max_tokens: int,
+                           on_chunk: Optional[Callable[[str], None]] = None) -> str:
         """Call Ollama with automatic Gemini fallback on 502 errors"""
         import asyncio
         from datetime import datetime
         
         start_time = datetime.now()
         logging.info(f"Ollama API call started at {start_time}")
+        loop = asyncio.get_running_loop()
         
         def make_request():
             import time
             max_retries = 3
+            streamed = False
             
             for attempt in range(max_retries):
                 try:
-                    import ollama
-                    
-                    # Try local first, then cloud if API key available
-                    client = None
-                    
-                    # Try local Ollama first
-                    try:
-                        client = ollama.Client()
-                        # Test connection
-                        client.list()
-                        logging.info("Using local Ollama")
-                    except Exception:
-                        client = None
-                    
-                    # If local fails and we have API key, try cloud
-                    if client is None and self.api_key:
-                        try:
-                            client = ollama.Client(
-                                host='https://ollama.com',
-                                headers={'Authorization': self.api_key}
-                            )
-                            logging.info("Using Ollama Cloud")
-                        except Exception:
-                            client = None
-                    
-                    if client is None:
-                        raise Exception("Ollama not available locally or in cloud")
+                    # Local first, then cloud if API key available
+                    client = self._get_ollama_client()
                     
                     logging.info(f"Making Ollama request (attempt {attempt + 1}/{max_retries}) with {len(prompt)} chars")
                     
@@ -300,13 +361,26 @@ class LLMClient:
                         options={
                             'temperature': 0.1,
                             'top_p': 0.9
-                        }
+                        },
+                        stream=on_chunk is not None
                     )
                     
+                    if on_chunk is not None:
+                        # Hand each piece to the caller's loop as it arrives
+                        parts = []
+                        for part in response:
+                            text = part['message']['content']
+                            if text:
+                                parts.append(text)
+                                streamed = True
+                                loop.call_soon_threadsafe(on_chunk, text)
+                        content = ''.join(parts)
+                    else:
+                        content = response['message']['content']
+                    
                     elapsed = (datetime.now() - start_time).total_seconds()
                     logging.info(f"Ollama response received after {elapsed:.1f}s")
                     
-                    content = response['message']['content']
                     logging.info(f"Ollama success: {len(content)} chars returned")
                     return content
                         
@@ -315,21 +389,24 @@ class LLMClient:
                 except Exception as e:
                     error_str = str(e).lower()
                     is_server_error = "502" in error_str or "upstream" in error_str or "bad gateway" in error_str
+                    if not is_server_error:
+                        # Resolve local/cloud again next time (e.g. local server went away)
+                        self._ollama_client = None
                     
-                    if is_server_error and attempt < max_retries - 1:
+                    # Once chunks have reached the caller a retry would repeat them
+                    if is_server_error and attempt < max_retries - 1 and not streamed:
                         wait_time = (attempt + 1) * 2  # 2, 4, 6 seconds
                         logging.warning(f"Ollama 502 error on attempt {attempt + 1}, retrying in {wait_time}s...")
                         time.sleep(wait_time)
                         continue
                     elif is_server_error:
-                        raise Exception(f"Ollama server error (502) after {max_retries} attempts: {str(e)}")
+                        raise Exception(f"Ollama server error (502) after {attempt + 1} attempts: {str(e)}")
                     else:
                         raise Exception(f"Ollama error: {str(e)}")
             
             raise Exception("Max retries exceeded")
         
         try:
-            loop = asyncio.get_event_loop()
             result = await loop.run_in_executor(None, make_request)
             return result
         except Exception as e:
@@ -24,14 +24,19 @@ class SimpleSessionManager:
         """Save session data to URL parameters"""
         if st.session_state.get('authenticated', False):
             login_time = st.session_state.get('login_timestamp', 0)
-            session_hash = self.generate_session_hash(login_time)
-            
-            # Update query parameters
-            st.query_params.update({
+            params = {
                 "auth": "true",
                 "t": str(int(login_time)),
-                "h": session_hash
-            })
+                "h": self.generate_session_hash(login_time)
+            }
+            
+            # Runs on every authenticated rerun; only touch the URL when it changes
+            query_params = st.query_params
+            if all(query_params.get(key) == value for key, value in params.items()):
+                return
+            
+            # Update query parameters
+            query_params.update(params)
     
     def restore_session_from_url(self):
         """Restore session from URL parameters"""